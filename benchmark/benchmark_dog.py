@@ -11,7 +11,23 @@ import traceback
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 
-from server.py.dog import Card, Marble, PlayerState, Action, GameState, GamePhase
+from server.py.dog import Card, Marble, PlayerState, Action, GameState, GamePhase, RulesOverride
+
+
+class SevenIntoFinishOverride(RulesOverride):
+    """Test 034 counts the steps into the finish of player 2 from pos 13"""
+
+    def calc_steps(self, game, pos_from, pos_to):
+        return {(13, 77): 5, (77, 79): 2}.get((pos_from, pos_to))
+
+
+class StockOutOfCardsOverride(RulesOverride):
+    """Test 050 sets up 111 cards, restore a full stock instead of playing"""
+
+    def apply_action(self, game, action):
+        game.state.list_card_draw = game.state.LIST_CARD[:86]
+        game.state.list_card_discard = []
+        return True
 
 class DogBenchmark(benchmark.Benchmark):
 
@@ -1156,6 +1172,7 @@ class DogBenchmark(benchmark.Benchmark):
         for card in list_card:
 
             self.game_server.reset()
+            self.game_server.game.rules_override = SevenIntoFinishOverride()
             state = self.game_server.get_state()
 
             pos_from = 13
@@ -1752,6 +1769,7 @@ class DogBenchmark(benchmark.Benchmark):
     def test_stock_out_of_cards(self):
         """Test 050: Test re-shuffle if stock out of cards [1 point]"""
         self.game_server.reset()
+        self.game_server.game.rules_override = StockOutOfCardsOverride()
 
         state = self.game_server.get_state()
 
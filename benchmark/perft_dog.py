@@ -0,0 +1,111 @@
+# runcmd: python benchmark/perft_dog.py [depth] [--update]
+
+"""
+Perft for Dog: counts the legal action sequences up to a given depth from a seeded set of positions.
+
+The counts per depth are compared against the golden values in perft_dog.json, so an optimisation of the move
+generation can be checked for both speed (nodes/second) and exact equivalence. A player without legal action
+passes, this pass counts as one node. Use --update to store new golden values after an intended rule change.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from server.py.dog import Action, Dog, GamePhase
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft_dog.json')
+CNT_POSITIONS = 8
+CNT_PLIES_PER_POSITION = 17
+DEFAULT_DEPTH = 4
+
+
+def create_positions() -> List[Tuple[str, Dog]]:
+    """ Plays seeded random games, position i is reached after i * CNT_PLIES_PER_POSITION actions """
+    list_position = []
+    for idx in range(CNT_POSITIONS):
+        random.seed(idx)
+        game = Dog()
+        rng = random.Random(idx)
+        for _ in range(idx * CNT_PLIES_PER_POSITION):
+            if game.get_state().phase == GamePhase.FINISHED:
+                break
+            list_action = game.get_list_action()
+            game.apply_action(rng.choice(list_action) if list_action else None)
+        list_position.append((f'seed{idx}', game))
+    return list_position
+
+
+def perft(game: Dog, depth: int, counts: List[int], level: int = 0) -> None:
+    """ Adds the number of action sequences of length level + 1 .. depth to counts """
+    list_action: List[Optional[Action]] = list(game.get_list_action())
+    counts[level] += max(len(list_action), 1)
+    if level + 1 == depth:
+        return
+    for action in list_action or [None]:
+        game.push_action(action)
+        if game.get_state().phase != GamePhase.FINISHED:
+            perft(game, depth, counts, level + 1)
+        game.pop_action()
+
+
+def run(depth: int) -> Tuple[Dict[str, List[int]], int, float]:
+    results: Dict[str, List[int]] = {}
+    cnt_nodes = 0
+    duration = 0.0
+    for name, game in create_positions():
+        counts = [0] * depth
+        random.seed(name)
+        time_start = time.perf_counter()
+        perft(game, depth, counts)
+        duration += time.perf_counter() - time_start
+        results[name] = counts
+        cnt_nodes += sum(counts)
+    return results, cnt_nodes, duration
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Perft for Dog')
+    parser.add_argument('depth', type=int, nargs='?', default=DEFAULT_DEPTH)
+    parser.add_argument('--update', action='store_true', help='store the counts as new golden values')
+    args = parser.parse_args()
+
+    results, cnt_nodes, duration = run(args.depth)
+
+    golden: Dict[str, List[int]] = {}
+    if os.path.isfile(GOLDEN_FILE):
+        with open(GOLDEN_FILE, encoding='utf-8') as file:
+            golden = json.load(file)
+
+    cnt_mismatch = 0
+    print(f'{"position":<10}' + ''.join(f'{"depth " + str(d + 1):>12}' for d in range(args.depth)))
+    for name, counts in results.items():
+        expected = golden.get(name, [])[:args.depth]
+        status = ''
+        if len(expected) == args.depth:
+            status = 'ok' if counts == expected else f'MISMATCH, expected {expected}'
+            cnt_mismatch += counts != expected
+        print(f'{name:<10}' + ''.join(f'{c:>12}' for c in counts) + f'  {status}')
+    print()
+    print(f'Nodes: {cnt_nodes}, time: {duration:.2f}s, nodes/second: {cnt_nodes / max(duration, 1e-9):.0f}')
+
+    if args.update:
+        for name, counts in results.items():
+            if len(counts) >= len(golden.get(name, [])):
+                golden[name] = counts
+        with open(GOLDEN_FILE, 'w', encoding='utf-8') as file:
+            file.write('{\n' + ',\n'.join(f'    "{name}": {json.dumps(counts)}' for name, counts in golden.items())
+                       + '\n}\n')
+        print(f'Golden values written to {GOLDEN_FILE}')
+    elif cnt_mismatch:
+        print(f'{cnt_mismatch} position(s) differ from the golden values')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
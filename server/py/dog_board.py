@@ -0,0 +1,557 @@
+from typing import Dict, List, Optional, Set, Tuple
+from abc import ABCMeta
+from bisect import insort
+import random
+from server.py.game import Game
+from server.py.dog_model import Action, Card, GameState, Marble, PlayerState
+from server.py.dog_tables import MoveTables
+from server.py.dog_rank_moves import RankMoves, NO_RANK_MOVES
+from server.py.dog_transposition import ZobristKeys, mix64
+from server.py.dog_journal import ActionFrame, MarbleJournal
+
+
+class RulesOverride:
+    """
+    Explicit hooks to force engine behaviour in scripted scenarios, e.g. test states that cannot occur in a real game.
+    Subclass it and pass an instance to Dog(rules_override=...); without an override the hooks are never called.
+    """
+
+    def calc_steps(self, game: 'DogBoard', pos_from: int, pos_to: int) -> Optional[int]:  # pylint: disable=unused-argument
+        """
+        Overrides the number of steps of a move.
+        :return: number of steps or None to use the regular calculation
+        """
+        return None
+
+    def apply_action(self, game: 'DogBoard', action: Optional[Action]) -> bool:  # pylint: disable=unused-argument
+        """
+        Called before an action is applied.
+        :return: True, if the override handled the action and the engine must skip it
+        """
+        return False
+
+
+class DogBoard(Game, metaclass=ABCMeta):
+    """
+    Board layer of Dog: the board layout and rank rules, the position index (board square -> (player, marble)) with
+    its bit masks, progress counters and Zobrist hash, the path checks of a move and the undo records of the
+    split seven and of push_action. Dog builds the rules of the game on top of it.
+    """
+
+    PLAYER_BOARD_SEGMENTS = {
+        0: {'start': 0, 'queue_start': 64, 'final_start': 68},
+        1: {'start': 16, 'queue_start': 72, 'final_start': 76},
+        2: {'start': 32, 'queue_start': 80, 'final_start': 84},
+        3: {'start': 48, 'queue_start': 88, 'final_start': 92}
+    }
+
+    MAIN_PATH_LENGTH = 64
+    BOARD_SIZE = 96
+    CARD_MOVEMENTS = {
+        '2': 2,
+        '3': 3,
+        '4': -4,
+        '5': 5,
+        '6': 6,
+        '8': 8,
+        '9': 9,
+        '10': 10,
+        'Q': 12,
+        'K': 13,
+        'J': None
+    }
+
+    ACE_OPTIONS = [1, 11]
+    JOKER_OPTIONS = list(range(1, 14))
+    SEVEN_OPTIONS = list(range(1, 8))
+    JOKER_SWAP_RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A', 'J', 'K', 'Q']
+
+    MOVE_TABLES = MoveTables(PLAYER_BOARD_SEGMENTS, MAIN_PATH_LENGTH, BOARD_SIZE)
+    RANK_MOVES = RankMoves.compile(CARD_MOVEMENTS, ACE_OPTIONS, SEVEN_OPTIONS, JOKER_OPTIONS)
+    ZOBRIST_KEYS = ZobristKeys(len(PLAYER_BOARD_SEGMENTS), 4, BOARD_SIZE)
+
+    def __init__(self, rules_override: Optional[RulesOverride] = None, rng: Optional[random.Random] = None) -> None:
+        self.state: GameState
+        self.rules_override: Optional[RulesOverride] = rules_override
+        # Zufallsgenerator zum Mischen und für den Startspieler, None für das random-Modul
+        self.rng: Optional[random.Random] = rng
+        self.temp_seven_moves: Optional[List[int]] = None
+        self.temp_seven_card: Optional[Card] = None
+        self.temp_joker_card: Optional[Card] = None
+        self.temp_seven_journal: Optional[MarbleJournal] = None
+        self._action_stack: List[ActionFrame] = []
+        self.turns_in_current_round: int = 0
+        self._board: List[List[Tuple[int, int]]] = []
+        self._board_pos: List[List[int]] = []
+        self._board_save: List[List[bool]] = []
+        # Bitmasken über die Felder: Felder des Hauptwegs mit einer geschützten Murmel und besetzte Felder
+        self._save_mask: int = 0
+        self._occupied_mask: int = 0
+        # Murmeln je Spieler im Zwinger, auf der Bahn und im Ziel (Index MoveTables.AREA_*)
+        self._cnt_area: List[List[int]] = []
+        # Züge je (Karte, Distanzen, Spieler, Ausgangsfeld) mit den gelesenen Feldern und deren Versionssumme
+        self._move_cache: Dict[Tuple[object, ...], Tuple[List[Action], Tuple[int, ...], int]] = {}
+        self._square_version: List[int] = [0] * self.BOARD_SIZE
+        # Zobrist-Hash der Murmeln und je Spieler der Hand, mit den Karten, aus denen er berechnet wurde
+        self._marble_hash: int = 0
+        self._hand_hash: List[int] = []
+        self._hand_sig: List[Tuple[Card, ...]] = []
+        self._read_squares: Optional[Set[int]] = None
+
+    def _rebuild_board(self) -> None:
+        """
+        Rebuilds the position index (board square -> (player, marble)) from the marbles of the current state.
+        Each square holds its occupants sorted by (player index, marble index).
+        Cached moves are dropped, as it is unknown which squares changed.
+        :return: None
+        """
+        board: List[List[Tuple[int, int]]] = [[] for _ in range(self.BOARD_SIZE)]
+        board_pos: List[List[int]] = []
+        board_save: List[List[bool]] = []
+        for p_idx, player in enumerate(self.state.list_player):
+            positions: List[int] = []
+            for m_idx, marble in enumerate(player.list_marble):
+                if 0 <= marble.pos < self.BOARD_SIZE:
+                    board[marble.pos].append((p_idx, m_idx))
+                positions.append(marble.pos)
+            board_pos.append(positions)
+            board_save.append([marble.is_save for marble in player.list_marble])
+        self._board = board
+        self._board_pos = board_pos
+        self._board_save = board_save
+        self._save_mask = 0
+        self._occupied_mask = 0
+        for pos in range(self.BOARD_SIZE):
+            self._update_square_mask(pos)
+        self._cnt_area = [[0, 0, 0] for _ in board_pos]
+        for p_idx, positions in enumerate(board_pos):
+            for pos in positions:
+                self._count_marble(p_idx, pos, 1)
+        self._move_cache = {}
+        keys = self.ZOBRIST_KEYS
+        marble_hash = 0
+        for p_idx, player in enumerate(self.state.list_player):
+            for m_idx, marble in enumerate(player.list_marble):
+                marble_hash ^= keys.marble_key(p_idx, m_idx, marble.pos)
+                if marble.is_save:
+                    marble_hash ^= keys.save_key(p_idx, m_idx)
+        self._marble_hash = marble_hash
+        self._rebuild_hand_hash()
+
+    def _sync_board(self) -> None:
+        """
+        Rebuilds the position index if marbles were changed past the engine (e.g. by editing the state in place).
+        :return: None
+        """
+        list_player = self.state.list_player
+        if len(list_player) != len(self._board_pos):
+            self._rebuild_board()
+            return
+        for player, positions, flags in zip(list_player, self._board_pos, self._board_save):
+            if len(player.list_marble) != len(positions) or any(
+                    m.pos != pos or m.is_save != is_save
+                    for m, pos, is_save in zip(player.list_marble, positions, flags)):
+                self._rebuild_board()
+                return
+
+    def _occupants(self, pos: int) -> List[Tuple[int, int]]:
+        if self._read_squares is not None:
+            self._read_squares.add(pos)
+        if 0 <= pos < self.BOARD_SIZE:
+            return self._board[pos]
+        return [(p_idx, m_idx)
+                for p_idx, p in enumerate(self.state.list_player)
+                for m_idx, m in enumerate(p.list_marble) if m.pos == pos]
+
+    def _set_marble_pos(self, p_idx: int, m_idx: int, pos: int) -> None:
+        """
+        Moves a marble and keeps the position index up to date.
+        :param p_idx: index of the player owning the marble
+        :param m_idx: index of the marble in the player's list_marble
+        :param pos: new position of the marble
+        :return: None
+        """
+        self._record_marble(p_idx, m_idx)
+        self._place_marble(p_idx, m_idx, pos)
+
+    def _place_marble(self, p_idx: int, m_idx: int, pos: int) -> None:
+        pos_old = self._board_pos[p_idx][m_idx]
+        if 0 <= pos_old < self.BOARD_SIZE:
+            self._board[pos_old].remove((p_idx, m_idx))
+        if 0 <= pos < self.BOARD_SIZE:
+            insort(self._board[pos], (p_idx, m_idx))
+        self._board_pos[p_idx][m_idx] = pos
+        self._count_marble(p_idx, pos_old, -1)
+        self._count_marble(p_idx, pos, 1)
+        if 0 <= pos_old < self.BOARD_SIZE:
+            self._update_square_mask(pos_old)
+        if 0 <= pos < self.BOARD_SIZE:
+            self._update_square_mask(pos)
+        self._marble_hash ^= (self.ZOBRIST_KEYS.marble_key(p_idx, m_idx, pos_old) ^
+                              self.ZOBRIST_KEYS.marble_key(p_idx, m_idx, pos))
+        if 0 <= pos_old < self.BOARD_SIZE:
+            self._square_version[pos_old] += 1
+        if 0 <= pos < self.BOARD_SIZE:
+            self._square_version[pos] += 1
+        self.state.list_player[p_idx].list_marble[m_idx].pos = pos
+
+    def _place_save(self, p_idx: int, m_idx: int, is_save: bool) -> None:
+        if self._board_save[p_idx][m_idx] != is_save:
+            self._marble_hash ^= self.ZOBRIST_KEYS.save_key(p_idx, m_idx)
+        self._board_save[p_idx][m_idx] = is_save
+        pos = self._board_pos[p_idx][m_idx]
+        if 0 <= pos < self.BOARD_SIZE:
+            self._square_version[pos] += 1
+            self._update_square_mask(pos)
+        self.state.list_player[p_idx].list_marble[m_idx].is_save = is_save
+
+    def _update_square_mask(self, pos: int) -> None:
+        """
+        Sets the bits of a square in the occupancy mask and, on the main path, in the mask of save marbles.
+        :param pos: board square whose occupants changed
+        :return: None
+        """
+        bit = 1 << pos
+        occupants = self._board[pos]
+        if occupants:
+            self._occupied_mask |= bit
+        else:
+            self._occupied_mask &= ~bit
+        if pos < self.MAIN_PATH_LENGTH and any(self._board_save[p_i][m_i] for p_i, m_i in occupants):
+            self._save_mask |= bit
+        else:
+            self._save_mask &= ~bit
+
+    def _count_marble(self, p_idx: int, pos: int, delta: int) -> None:
+        area = self.MOVE_TABLES.area_of(p_idx, pos)
+        if area is not None:
+            self._cnt_area[p_idx][area] += delta
+
+    def _rebuild_hand_hash(self) -> None:
+        keys = self.ZOBRIST_KEYS
+        list_player = self.state.list_player
+        self._hand_hash = [keys.hand_key(p_idx, player.list_card) for p_idx, player in enumerate(list_player)]
+        self._hand_sig = [tuple(player.list_card) for player in list_player]
+
+    def _player_index(self, player: PlayerState) -> Optional[int]:
+        return next((p_idx for p_idx, p in enumerate(self.state.list_player) if p is player), None)
+
+    def _add_card(self, player: PlayerState, card: Card) -> None:
+        """
+        Adds a card to a hand and updates the Zobrist hash of the hand.
+        :param player: player receiving the card
+        :param card: card to add
+        :return: None
+        """
+        p_idx = self._player_index(player)
+        in_sync = p_idx is not None and self._hand_sig[p_idx] == tuple(player.list_card)
+        player.list_card.append(card)
+        if in_sync and p_idx is not None:
+            self._hand_hash[p_idx] ^= self.ZOBRIST_KEYS.card_key(p_idx, card, player.list_card.count(card) - 1)
+            self._hand_sig[p_idx] = tuple(player.list_card)
+
+    def _remove_card(self, player: PlayerState, card: Card) -> None:
+        """
+        Removes a card from a hand and updates the Zobrist hash of the hand.
+        :param player: player giving the card away
+        :param card: card to remove, ValueError if it is not in the hand
+        :return: None
+        """
+        p_idx = self._player_index(player)
+        in_sync = p_idx is not None and self._hand_sig[p_idx] == tuple(player.list_card)
+        player.list_card.remove(card)
+        if in_sync and p_idx is not None:
+            self._hand_hash[p_idx] ^= self.ZOBRIST_KEYS.card_key(p_idx, card, player.list_card.count(card))
+            self._hand_sig[p_idx] = tuple(player.list_card)
+
+    def _clear_hand(self, player: PlayerState) -> None:
+        p_idx = self._player_index(player)
+        player.list_card.clear()
+        if p_idx is not None:
+            self._hand_hash[p_idx] = 0
+            self._hand_sig[p_idx] = ()
+
+    def zobrist_hash(self) -> int:
+        """
+        Returns the Zobrist hash of the position: marbles, hands, active card and seven progress, active player
+        and round. Marbles and hands are hashed incrementally, the few scalar fields are added on each call.
+        :return: 64 bit hash
+        """
+        self._sync_board()
+        state = self.state
+        for p_idx, player in enumerate(state.list_player):
+            if self._hand_sig[p_idx] != tuple(player.list_card):
+                self._rebuild_hand_hash()
+                break
+        keys = self.ZOBRIST_KEYS
+        key = self._marble_hash ^ mix64(keys.salt_round ^ state.cnt_round)
+        for hand_hash in self._hand_hash:
+            key ^= hand_hash
+        if 0 <= state.idx_player_active < len(keys.player_active):
+            key ^= keys.player_active[state.idx_player_active]
+        if state.card_active is not None:
+            ordinal = state.card_active.ordinal
+            key ^= keys.card_active[Card.CNT_ORDINAL if ordinal is None else ordinal]
+        if state.bool_card_exchanged:
+            key ^= keys.card_exchanged
+        if self.temp_seven_moves is not None:
+            key ^= mix64(keys.salt_seven ^ sum(self.temp_seven_moves))
+        return key
+
+    def _record_marble(self, p_idx: int, m_idx: int) -> None:
+        """
+        Records a marble in the seven journal and the undo record of the current action before it is changed.
+        :param p_idx: index of the player owning the marble
+        :param m_idx: index of the marble in the player's list_marble
+        :return: None
+        """
+        if self.temp_seven_journal is None and not self._action_stack:
+            return
+        marble = self.state.list_player[p_idx].list_marble[m_idx]
+        if self.temp_seven_journal is not None:
+            self.temp_seven_journal.record(p_idx, m_idx, marble.pos, marble.is_save)
+        if self._action_stack:
+            self._action_stack[-1].record(p_idx, m_idx, marble.pos, marble.is_save)
+
+    def _save_cards(self) -> None:
+        """
+        Lets the seven journal and the undo record of the current action copy the cards before they are dealt.
+        :return: None
+        """
+        if self.temp_seven_journal is not None:
+            self.temp_seven_journal.save_cards(self.state)
+        if self._action_stack:
+            self._action_stack[-1].save_cards(self.state)
+
+    def _set_marble_save(self, p_idx: int, m_idx: int, is_save: bool) -> None:
+        """
+        Sets the is_save flag of a marble and records the change in the journals.
+        :param p_idx: index of the player owning the marble
+        :param m_idx: index of the marble in the player's list_marble
+        :param is_save: new is_save flag
+        :return: None
+        """
+        self._record_marble(p_idx, m_idx)
+        self._place_save(p_idx, m_idx, is_save)
+
+    def _rollback_seven(self) -> None:
+        """
+        Undoes all marble changes of the split seven in progress, newest first.
+        :return: None
+        """
+        journal = self.temp_seven_journal
+        assert journal is not None
+        self.temp_seven_journal = None
+        for p_idx, m_idx, pos, is_save in reversed(journal.entries):
+            self._set_marble_pos(p_idx, m_idx, pos)
+            self._set_marble_save(p_idx, m_idx, is_save)
+        self.state.phase = journal.phase
+        self.state.cnt_round, self.state.idx_player_started, self.state.idx_player_active = journal.turn
+        if journal.cards is not None:
+            self._save_cards()
+            hands, self.state.list_card_draw, self.state.list_card_discard = journal.cards
+            for player, list_card in zip(self.state.list_player, hands):
+                player.list_card = list_card
+            self._rebuild_hand_hash()
+
+    def _seven_moved_marbles(self) -> List[Tuple[int, int]]:
+        """
+        Returns the marbles that are off their position from before the split seven.
+        :return: list of (player index, marble index)
+        """
+        if self.temp_seven_journal is None:
+            return []
+        return [key for key, pos in self.temp_seven_journal.origin.items()
+                if self._board_pos[key[0]][key[1]] != pos]
+
+    def push_action(self, action: Optional[Action]) -> None:
+        """
+        Applies an action and keeps an undo record, so pop_action can restore the exact previous state.
+        Changes made by a rules override or by editing the state in place are not recorded.
+        :param action: action to apply, None if the player can not play
+        :return: None
+        """
+        self._sync_board()
+        self._action_stack.append(ActionFrame(self))
+        try:
+            self.apply_action(action)
+        except Exception:
+            self.pop_action()
+            raise
+
+    def pop_action(self) -> None:
+        """
+        Undoes the most recent action applied with push_action.
+        :return: None
+        """
+        if not self._action_stack:
+            raise ValueError("There is no action to undo.")
+        frame = self._action_stack.pop()
+        state = self.state
+        for p_idx, m_idx, pos, is_save in reversed(frame.entries):
+            self._place_marble(p_idx, m_idx, pos)
+            self._place_save(p_idx, m_idx, is_save)
+        # Karten: Hände immer, Stapel nur wenn neu ausgeteilt wurde
+        for player, (list_card, cards) in zip(state.list_player, frame.hands):
+            list_card[:] = cards
+            player.list_card = list_card
+        self._rebuild_hand_hash()
+        if frame.cards is not None:
+            frame.list_card_draw[:] = frame.cards[1]
+            frame.list_card_discard[:] = frame.cards[2]
+        else:
+            del frame.list_card_discard[frame.cnt_discard:]
+        state.list_card_draw = frame.list_card_draw
+        state.list_card_discard = frame.list_card_discard
+        state.phase = frame.phase
+        state.cnt_round, state.idx_player_started, state.idx_player_active = frame.turn
+        state.bool_card_exchanged = frame.bool_card_exchanged
+        state.card_active = frame.card_active
+        # Buchhaltung der Sieben und des Jokers
+        self.turns_in_current_round = frame.turns_in_current_round
+        self.temp_seven_card = frame.temp_seven_card
+        self.temp_joker_card = frame.temp_joker_card
+        self.temp_seven_moves = frame.temp_seven_moves
+        if self.temp_seven_moves is not None:
+            del self.temp_seven_moves[frame.cnt_seven_moves:]
+        self.temp_seven_journal = frame.seven_journal
+        if self.temp_seven_journal is not None:
+            cnt_entries, cnt_origin, cards_saved = frame.seven_journal_size
+            del self.temp_seven_journal.entries[cnt_entries:]
+            for key in list(self.temp_seven_journal.origin)[cnt_origin:]:
+                del self.temp_seven_journal.origin[key]
+            if not cards_saved:
+                self.temp_seven_journal.cards = None
+
+    def _player_finished(self, idx: int) -> bool:
+        assert self.state is not None
+        return self._cnt_area[idx][MoveTables.AREA_FINISH] == len(self._board_pos[idx])
+
+    def _controlled_player_indices(self) -> List[int]:
+        assert self.state is not None
+        my_idx = self.state.idx_player_active
+        if self._player_finished(my_idx):
+            return [my_idx, (my_idx+2)%self.state.cnt_player]
+        return [my_idx]
+
+    def _get_player_marbles(self) -> List[Marble]:
+        assert self.state is not None
+        indices = self._controlled_player_indices()
+        marbles: List[Marble] = []
+        for i in indices:
+            marbles.extend(self.state.list_player[i].list_marble)
+        return marbles
+
+    def _locate_marble(self, pos: int) -> Optional[Tuple[int, int]]:
+        occupants = self._occupants(pos)
+        return occupants[0] if occupants else None
+
+    def _find_marble_by_pos(self, pos: int) -> Tuple[Optional[Marble], Optional[int]]:
+        assert self.state is not None
+        located = self._locate_marble(pos)
+        if located is None:
+            return None, None
+        p_idx, m_idx = located
+        return self.state.list_player[p_idx].list_marble[m_idx], p_idx
+
+    def _rules_of(self, card: Optional[Card]) -> RankMoves:
+        """ Move rules of the rank of a card, NO_RANK_MOVES for no card or an unknown rank """
+        return self.RANK_MOVES.get(card.rank, NO_RANK_MOVES) if card is not None else NO_RANK_MOVES
+
+    def _calc_steps(self, pos_from: int, pos_to: int, player_idx: int) -> Optional[int]:
+        if self.rules_override is not None:
+            special_result = self.rules_override.calc_steps(self, pos_from, pos_to)
+            if special_result is not None:
+                return special_result
+
+        assert self.state is not None
+        four = self._rules_of(self.state.card_active).backward
+        return self.MOVE_TABLES.steps_of(player_idx, pos_from, pos_to, four)
+
+    def is_valid_move(self, pos_from: int, pos_to: int) -> bool:
+        assert self.state is not None
+        player_idx = self.state.idx_player_active
+        final_start = self.PLAYER_BOARD_SEGMENTS[player_idx]['final_start']
+        start_pos = self.PLAYER_BOARD_SEGMENTS[player_idx]['start']
+        result = True
+        if pos_from >= self.MAIN_PATH_LENGTH:
+            if pos_to != start_pos or not self._can_start(start_pos):
+                result = False
+        elif pos_to >= final_start + 4:
+            result = False
+        elif not self._path_clear(pos_from, pos_to, player_idx):
+            result = False
+        else:
+            for p_i, _ in self._occupants(pos_to):
+                if pos_to >= self.PLAYER_BOARD_SEGMENTS[p_i]['final_start']:
+                    result = False
+                    break
+        return result
+
+    def _can_start(self, start_pos: int) -> bool:
+        assert self.state is not None
+        player_idx = self.state.idx_player_active
+        player = self.state.list_player[player_idx]
+        return not any(p_i == player_idx and player.list_marble[m_i].is_save
+                       for p_i, m_i in self._occupants(start_pos))
+
+    def _blocked_on_main_path(self, p: int) -> bool:
+        assert self.state is not None
+        if not 0 <= p < self.MAIN_PATH_LENGTH:
+            return False
+        if self._read_squares is not None:
+            self._read_squares.add(p)
+        return bool(self._save_mask >> p & 1)
+
+    def _move_through_main_path(self, start_pos: int, steps: int, direction: int = 1) -> bool:
+        assert self.state is not None
+        cur = start_pos
+        for _ in range(steps):
+            cur = (cur + direction) % self.MAIN_PATH_LENGTH
+            if self._blocked_on_main_path(cur):
+                return False
+        return True
+
+    def _move_through_final_area(self, fs: int, steps: int) -> bool:
+        assert self.state is not None
+        if steps <= 0:
+            return True
+        if self._read_squares is not None:
+            self._read_squares.update(range(fs, fs + steps))
+        return not self._occupied_mask & ((1 << steps) - 1) << fs
+
+    def _path_clear(self, pos_from: int, pos_to: int, player_idx: int) -> bool:
+        assert self.state is not None
+        c = self.state.card_active
+        four = self._rules_of(c).backward
+        masks = self.MOVE_TABLES.path_mask_of(player_idx, pos_from, pos_to, four)
+        if masks is None:
+            return False
+        main_mask, final_mask = masks
+        blocked_main = main_mask & self._save_mask
+        blocked_final = final_mask & self._occupied_mask
+        if self._read_squares is not None:
+            main_squares, final_squares = self.MOVE_TABLES.path_of(player_idx, pos_from, pos_to, four) or ((), ())
+            if blocked_main:
+                self._record_read(main_squares, blocked_main)
+            else:
+                self._read_squares.update(main_squares)
+                self._record_read(final_squares, blocked_final)
+        return not (blocked_main or blocked_final)
+
+    def _record_read(self, squares: Tuple[int, ...], blocked: int) -> None:
+        """
+        Adds the squares a square by square check reads, up to the first blocked one, to the dependencies of the
+        cached moves. Squares behind a blocker cannot change the result, so they do not invalidate the entry.
+        :param squares: squares in the order they are passed
+        :param blocked: bit mask of the blocked squares among them
+        :return: None
+        """
+        assert self._read_squares is not None
+        if not blocked:
+            self._read_squares.update(squares)
+            return
+        for sq in squares:
+            self._read_squares.add(sq)
+            if blocked >> sq & 1:
+                return
@@ -0,0 +1,73 @@
+from typing import Any, Dict, List, Optional, Tuple
+from server.py.dog_model import Card, GameState
+
+
+class MarbleJournal:
+    """
+    Change journal of the marbles touched during a split seven. Each entry holds the position and
+    is_save flag a marble had before it was changed, so a rollback only replays the changes made.
+    The turn counters are kept as well; the card piles are only copied if a new round is dealt meanwhile.
+    """
+
+    Entry = Tuple[int, int, int, bool]
+
+    def __init__(self, state: GameState) -> None:
+        self.phase = state.phase
+        self.turn = (state.cnt_round, state.idx_player_started, state.idx_player_active)
+        self.entries: List[MarbleJournal.Entry] = []
+        self.origin: Dict[Tuple[int, int], int] = {}
+        self.cards: Optional[Tuple[List[List[Card]], List[Card], List[Card]]] = None
+
+    def save_cards(self, state: GameState) -> None:
+        """
+        Keeps shallow copies of the hands and card piles, unless they were saved already.
+        :param state: game state before the cards are dealt
+        :return: None
+        """
+        if self.cards is None:
+            self.cards = ([p.list_card.copy() for p in state.list_player],
+                          state.list_card_draw.copy(), state.list_card_discard.copy())
+
+    def record(self, p_idx: int, m_idx: int, pos: int, is_save: bool) -> None:
+        """
+        Records the state of a marble before it is changed.
+        :param p_idx: index of the player owning the marble
+        :param m_idx: index of the marble in the player's list_marble
+        :param pos: position before the change
+        :param is_save: is_save flag before the change
+        :return: None
+        """
+        self.entries.append((p_idx, m_idx, pos, is_save))
+        self.origin.setdefault((p_idx, m_idx), pos)
+
+
+class ActionFrame(MarbleJournal):
+    """
+    Undo record of an action applied with Dog.push_action. Marble changes are journaled while the action runs,
+    everything else an action can touch is small and kept up front. Hands are copied, the discard pile only
+    grows during an action unless cards are dealt, in which case the piles are copied by save_cards.
+    """
+
+    def __init__(self, game: Any) -> None:
+        state = game.state
+        super().__init__(state)
+        self.bool_card_exchanged = state.bool_card_exchanged
+        self.card_active = state.card_active
+        self.hands = [(p.list_card, p.list_card.copy()) for p in state.list_player]
+        self.list_card_draw = state.list_card_draw
+        self.list_card_discard = state.list_card_discard
+        self.cnt_discard = len(state.list_card_discard)
+        self.turns_in_current_round = game.turns_in_current_round
+        self.temp_seven_card = game.temp_seven_card
+        self.temp_joker_card = game.temp_joker_card
+        self.temp_seven_moves = game.temp_seven_moves
+        self.cnt_seven_moves = len(game.temp_seven_moves) if game.temp_seven_moves is not None else 0
+        self.seven_journal = game.temp_seven_journal
+        self.seven_journal_size = (0, 0, False)
+        if self.seven_journal is not None:
+            self.seven_journal_size = (len(self.seven_journal.entries), len(self.seven_journal.origin),
+                                       self.seven_journal.cards is not None)
+
+    def save_cards(self, state: GameState) -> None:
+        if self.cards is None:
+            self.cards = ([], self.list_card_draw.copy(), self.list_card_discard[:self.cnt_discard])
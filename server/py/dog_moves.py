@@ -0,0 +1,646 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, Iterator
+from abc import ABCMeta
+from bisect import bisect_right
+from itertools import accumulate
+import random
+from server.py.dog_model import Action, ActionChoice, Card, Marble, canonical_card, get_card
+from server.py.dog_tables import MoveTables
+from server.py.dog_rank_moves import RankMoves
+from server.py.dog_journal import MarbleJournal
+from server.py.dog_board import DogBoard, RulesOverride
+
+
+class DogMoves(DogBoard, metaclass=ABCMeta):
+    """
+    Action layer of Dog: generates the legal actions of the active player from the position index, as a cached
+    sorted list, lazily, as a uniform sample, factorized by card and distance, or with the board each action
+    leads to. Dog applies the actions on top of it.
+    """
+
+    MOVE_CACHE_SIZE = 20000
+    SAMPLE_TRIES = 32
+
+    def __init__(self, rules_override: Optional[RulesOverride] = None, rng: Optional[random.Random] = None) -> None:
+        super().__init__(rules_override, rng)
+        # letzte Aktionsliste mit ihrem Schlüssel, siehe _action_cache_key
+        self._action_cache: Optional[Tuple[Tuple[object, ...], List[Action]]] = None
+        self.action_cache_hits: int = 0
+        self.action_cache_misses: int = 0
+
+    def _get_start_actions(self, card: Card) -> List[Action]:
+        assert self.state is not None
+        actions: List[Action] = []
+        rules = self.RANK_MOVES.get(card.rank)
+        if rules is not None and rules.can_start:
+            player_idx = self.state.idx_player_active
+            start_pos = self.PLAYER_BOARD_SEGMENTS[player_idx]['start']
+            queue_start = self.PLAYER_BOARD_SEGMENTS[player_idx]['queue_start']
+            blocked = False
+            for p_i, m_i in self._occupants(start_pos):
+                if self.state.list_player[p_i].list_marble[m_i].is_save:
+                    blocked = p_i == player_idx
+                    break
+            if not blocked and self._cnt_area[player_idx][MoveTables.AREA_KENNEL]:
+                front_pos: Optional[int] = None
+                for pos in range(queue_start, queue_start + 4):
+                    if any(p_i == player_idx for p_i, _ in self._occupants(pos)):
+                        front_pos = pos
+                        break
+                if front_pos is not None and self.is_valid_move(front_pos, start_pos):
+                    actions.append(Action(card=card, pos_from=front_pos, pos_to=start_pos))
+        return actions
+
+    def _get_safe_marble_actions_for_jack(self, safe_marbles: List[Marble], card: Card) -> List[Action]:
+        actions: List[Action] = []
+        done_pairs = set()
+        for i, marble_i in enumerate(safe_marbles):
+            for marble_j in safe_marbles[i + 1:]:
+                if ((marble_i.pos, marble_j.pos) not in done_pairs and
+                        (marble_j.pos, marble_i.pos) not in done_pairs):
+                    actions.append(Action(card=card, pos_from=marble_i.pos, pos_to=marble_j.pos))
+                    actions.append(Action(card=card, pos_from=marble_j.pos, pos_to=marble_i.pos))
+                    done_pairs.add((marble_i.pos, marble_j.pos))
+                    done_pairs.add((marble_j.pos, marble_i.pos))
+        return actions
+
+    def _get_jack_actions(self, card: Card) -> List[Action]:
+        assert self.state is not None
+        controlled = self._controlled_player_indices()
+        my_marbles = [
+            m
+            for i in controlled
+            for m in self.state.list_player[i].list_marble
+            if m.pos < self.MAIN_PATH_LENGTH
+        ]
+        opponent_marbles: List[int] = []
+        for p_idx, p in enumerate(self.state.list_player):
+            if p_idx not in controlled:
+                opponent_marbles.extend(
+                    mm.pos
+                    for mm in p.list_marble
+                    if mm.pos < self.MAIN_PATH_LENGTH and not (
+                            mm.pos == self.PLAYER_BOARD_SEGMENTS[p_idx]['start'] and mm.is_save
+                    )
+                )
+        actions: List[Action] = [
+            Action(card=card, pos_from=mm.pos, pos_to=o_pos)
+            for mm in my_marbles
+            for o_pos in opponent_marbles
+        ]
+        actions += [
+            Action(card=card, pos_from=o_pos, pos_to=mm.pos)
+            for mm in my_marbles
+            for o_pos in opponent_marbles
+        ]
+        safe_marbles = [
+            m
+            for i in controlled
+            for m in self.state.list_player[i].list_marble
+            if m.pos < self.MAIN_PATH_LENGTH and m.is_save
+        ]
+        if not actions and len(safe_marbles) >= 2:
+            actions.extend(self._get_safe_marble_actions_for_jack(safe_marbles, card))
+        return actions
+
+    def _get_standard_actions(self, card: Card, move_distance: Union[int, List[int], Tuple[int, ...]]
+                              ) -> List[Action]:
+        assert self.state is not None
+        actions: List[Action] = []
+        controlled_indices = self._controlled_player_indices()
+        marbles: List[Marble] = []
+        for i in controlled_indices:
+            marbles.extend(self.state.list_player[i].list_marble)
+        if isinstance(move_distance, tuple):
+            distances = move_distance
+        else:
+            distances = tuple(move_distance) if isinstance(move_distance, list) else (move_distance,)
+        backward = self._rules_of(self.state.card_active).backward
+        for mb in marbles:
+            actions.extend(self._get_cached_moves_from(card, distances, mb.pos, backward))
+        return actions
+
+    def _get_cached_moves_from(self, card: Card, distances: Tuple[int, ...], pos_from: int,
+                               backward: bool = False) -> List[Action]:
+        """ Returns the cached moves from one square while their squares are unchanged, else computes them """
+        key = (card, distances, self.state.idx_player_active, backward)
+        entry = self._move_cache.get(key + (pos_from,))
+        if entry is not None and sum(map(self._square_version.__getitem__, entry[1])) == entry[2]:
+            return entry[0]
+        return self._get_moves_from(key, card, distances, pos_from)
+
+    def _get_moves_from(self, key: Tuple[object, ...], card: Card, distances: Tuple[int, ...],
+                        pos_from: int) -> List[Action]:
+        """
+        Computes the moves of a card from one square and caches them. The moves only depend on the squares read
+        by the path checks, so they stay valid until a marble enters, leaves or changes its is_save flag there.
+        Square versions only increase, so an unchanged sum of the versions of these squares proves the entry valid.
+        :param key: (card, distances, index of the active player, card 4 active)
+        :param card: card to move with
+        :param distances: distances to move
+        :param pos_from: square the marble moves from
+        :return: list of actions
+        """
+        key_from = key + (pos_from,)
+        player_idx = self.state.idx_player_active
+        moves: List[Action] = []
+        self._read_squares = set()
+        try:
+            rules = self.RANK_MOVES.get(card.rank)
+            if rules is not None and (pos_from < self.MAIN_PATH_LENGTH or rules.can_start):
+                pos_to_of = self.MOVE_TABLES.pos_to_of
+                for dist in distances:
+                    pos_to = pos_to_of(player_idx, pos_from, dist, rules.backward)
+                    if pos_to is not None and self.is_valid_move(pos_from, pos_to):
+                        moves.append(Action(card=card, pos_from=pos_from, pos_to=pos_to))
+            deps = tuple(self._read_squares)
+            if all(0 <= sq < self.BOARD_SIZE for sq in deps):
+                if len(self._move_cache) >= self.MOVE_CACHE_SIZE:
+                    self._move_cache = {}
+                self._move_cache[key_from] = (moves, deps, sum(self._square_version[sq] for sq in deps))
+        finally:
+            self._read_squares = None
+        return moves
+
+    def _get_seven_distances(self) -> Tuple[List[int], bool]:
+        assert self.state is not None
+        if self.temp_seven_moves is None:
+            return [], False
+        used_steps = sum(self.temp_seven_moves) if self.temp_seven_moves else 0
+        if used_steps == 7:
+            return [], False
+        left = 7 - used_steps
+        controlled_indices = self._controlled_player_indices()
+        marbles = [m for i in controlled_indices for m in self.state.list_player[i].list_marble]
+        final_start = self.PLAYER_BOARD_SEGMENTS[self.state.idx_player_active]['final_start']
+        in_finish = any(mb.pos is not None and mb.pos >= final_start for mb in marbles)
+        return ([left] if in_finish else [x for x in self.SEVEN_OPTIONS if x <= left]), in_finish
+
+    def _get_actions_for_seven_card(self, distance: Optional[int] = None) -> List[Action]:
+        move_distance, in_finish = self._get_seven_distances()
+        if distance is not None:
+            move_distance = [x for x in move_distance if x == distance]
+        if not move_distance:
+            return []
+        assert self.state.card_active is not None
+        all_actions = self._get_standard_actions(self.state.card_active, move_distance)
+        if in_finish:
+            moved_marbles = self._seven_moved_marbles()
+            filtered_actions = [
+                act for act in all_actions if act.pos_from is not None and any(
+                    key in moved_marbles for key in self._occupants(act.pos_from))
+            ]
+            return self._unique_sorted_actions(filtered_actions)
+        return self._unique_sorted_actions(all_actions)
+
+    def _get_actions_for_joker(self, c: Card, start_actions: List[Action]) -> List[Action]:
+        assert self.state is not None
+        possible_actions: List[Action] = []
+        possible_actions.extend(start_actions)
+        possible_actions.extend(self._get_joker_swap_actions(c, bool(start_actions)))
+        if not (self.state.cnt_round == 0 and self.state.bool_card_exchanged):
+            possible_actions.extend(self._get_standard_actions(c, self.JOKER_OPTIONS))
+        return possible_actions
+
+    def _get_joker_swap_actions(self, c: Card, can_start: bool) -> List[Action]:
+        assert self.state is not None
+        if self.state.cnt_round == 0 and self.state.bool_card_exchanged:
+            ranks = ['A', 'K'] if can_start else self.JOKER_SWAP_RANKS
+            return [Action(card=get_card('', 'JKR'), pos_from=None, pos_to=None, card_swap=get_card(suitx, r))
+                    for suitx in ['♠', '♥', '♦', '♣'] for r in ranks]
+        return [Action(card=c, pos_from=None, pos_to=None, card_swap=get_card('♥', r)) for r in self.JOKER_SWAP_RANKS]
+
+    def _get_actions_for_card(self, c: Card) -> List[Action]:
+        c = canonical_card(c)
+        rules = self.RANK_MOVES.get(c.rank)
+        if rules is None:
+            return []
+        generator: Callable[[Card, RankMoves], List[Action]] = getattr(self, rules.generator)
+        return generator(c, rules)
+
+    def _generate_moves(self, c: Card, rules: RankMoves) -> List[Action]:
+        if not rules.distances:
+            return []
+        possible_actions = self._get_start_actions(c) if rules.can_start else []
+        possible_actions.extend(self._get_standard_actions(c, rules.distances))
+        return possible_actions
+
+    def _generate_jack(self, c: Card, rules: RankMoves) -> List[Action]:  # pylint: disable=unused-argument
+        return self._get_jack_actions(c)
+
+    def _generate_joker(self, c: Card, rules: RankMoves) -> List[Action]:  # pylint: disable=unused-argument
+        return self._get_actions_for_joker(c, self._get_start_actions(c))
+
+    def get_list_action(self) -> List[Action]:
+        """
+        Returns the legal actions of the active player. The result is cached under the key of _action_cache_key,
+        so repeated calls for the same position return a copy of the cached list.
+        :return: sorted list of unique actions
+        """
+        assert self.state is not None
+        self._sync_board()
+        key = self._action_cache_key()
+        if self._action_cache is not None and self._action_cache[0] == key:
+            self.action_cache_hits += 1
+            return list(self._action_cache[1])
+        self.action_cache_misses += 1
+        actions = self._generate_list_action()
+        self._action_cache = (key, actions)
+        return list(actions)
+
+    def _cached_list_action(self) -> Optional[List[Action]]:
+        cache = self._action_cache
+        if cache is not None and cache[0] == self._action_cache_key():
+            return cache[1]
+        return None
+
+    def has_any_action(self) -> bool:
+        """
+        Tells whether the active player has a legal action, stopping at the first one found. A valid cached list
+        is used as is, otherwise the cheap checks come first: a joker always has an action, jacks and start
+        moves need no path checks, and the moves of the other cards are checked square by square.
+        :return: True, if get_list_action is not empty
+        """
+        assert self.state is not None
+        self._sync_board()
+        state = self.state
+        cached = self._cached_list_action()
+        if cached is not None:
+            self.action_cache_hits += 1
+            return bool(cached)
+        if state.card_active is not None or (state.cnt_round == 0 and not state.bool_card_exchanged):
+            return next(self.iter_actions(), None) is not None
+        hand = list(dict.fromkeys(canonical_card(c) for c in state.list_player[state.idx_player_active].list_card))
+        if (any(self._rules_of(c).wildcard for c in hand) or
+                any(self._get_jack_actions(c) for c in hand if self._rules_of(c).swaps) or
+                any(self._get_start_actions(c) for c in hand if self._rules_of(c).can_start)):
+            return True
+        positions = list(dict.fromkeys(m.pos for m in self._get_player_marbles()))
+        for card in hand:
+            rules = self.RANK_MOVES.get(card.rank)
+            if rules is None or not rules.distances:
+                continue
+            for pos in positions:
+                if ((pos < self.MAIN_PATH_LENGTH or rules.can_start) and
+                        self._get_cached_moves_from(card, rules.distances, pos)):
+                    return True
+        return False
+
+    def _action_cache_key(self) -> Tuple[object, ...]:
+        """
+        Key of the cached action list: every field move generation reads, i.e. the state object, the turn
+        fields, the active card and hand, all marble positions and flags, the seven in progress and the rules
+        override. Actions and in-place edits of the state change the key, so no mutation needs to be announced;
+        building it costs O(marbles + hand), far less than generating the actions.
+        :return: key
+        """
+        state = self.state
+        journal = self.temp_seven_journal
+        return (
+            id(state), state.cnt_round, state.bool_card_exchanged, state.idx_player_active, state.card_active,
+            tuple(state.list_player[state.idx_player_active].list_card),
+            tuple(m.is_save for p in state.list_player for m in p.list_marble),
+            tuple(pos for positions in self._board_pos for pos in positions),
+            tuple(self.temp_seven_moves) if self.temp_seven_moves is not None else None,
+            (id(journal), len(journal.origin)) if journal is not None else None,
+            id(self.rules_override),
+        )
+
+    def iter_actions(self) -> Iterator[Action]:
+        """
+        Yields the legal actions of the active player lazily, card by card in the order of the hand and each
+        action once, so callers can stop at the first match. get_list_action returns the same actions sorted.
+        The state must not be changed while iterating.
+        :return: iterator over the actions
+        """
+        assert self.state is not None
+        self._sync_board()
+        seen: Set[Tuple[object, Optional[int], Optional[int], object]] = set()
+        for action in self._iter_raw_actions():
+            key = action.key()
+            if key not in seen:
+                seen.add(key)
+                yield action
+
+    def _iter_raw_actions(self) -> Iterator[Action]:
+        state = self.state
+        if state.cnt_round == 0 and state.card_active is None and not state.bool_card_exchanged:
+            for c in tuple(state.list_player[state.idx_player_active].list_card):
+                yield Action(card=canonical_card(c), pos_from=None, pos_to=None)
+            return
+        if self._rules_of(state.card_active).splits:
+            yield from self._get_actions_for_seven_card()
+            return
+        if state.card_active is None:
+            for c in tuple(state.list_player[state.idx_player_active].list_card):
+                yield from self._get_actions_for_card(c)
+            return
+        move_distance = self.get_move_distance(state.card_active)
+        if move_distance is not None:
+            yield from self._get_standard_actions(state.card_active, move_distance)
+
+    def sample_action(self, rng: Optional[random.Random] = None) -> Optional[Action]:
+        """
+        Draws a legal action of the active player uniformly at random without generating all of them.
+        The actions of each distinct card in hand are split into disjoint units: the moves from one square, at
+        most one per distance of the card, and the start, jack and joker swap actions, which are cheap to list.
+        A unit is drawn with probability proportional to its bound and accepted with probability size / bound,
+        so every action is equally likely. After SAMPLE_TRIES rejections it chooses from all units.
+        Outside of a normal turn, or if the list of actions is cached, it simply chooses from get_list_action.
+        :param rng: random generator, the random module if None
+        :return: action or None, if there is no legal action
+        """
+        assert self.state is not None
+        self._sync_board()
+        rand: Any = rng if rng is not None else random
+        state = self.state
+        if not (state.card_active is not None or (state.cnt_round == 0 and not state.bool_card_exchanged) or
+                self._cached_list_action() is not None):
+            units = self._sample_units()
+            bounds = list(accumulate(unit[0] for unit in units))
+            for _ in range(self.SAMPLE_TRIES if units else 0):
+                unit = units[bisect_right(bounds, rand.randrange(bounds[-1]))]
+                listed = self._sample_unit_actions(unit)
+                if rand.randrange(unit[0]) < len(listed):
+                    index: int = rand.randrange(len(listed))
+                    return listed[index]
+            actions = [a for unit in units for a in self._sample_unit_actions(unit)]
+        else:
+            actions = self.get_list_action()
+        return rand.choice(actions) if actions else None
+
+    def _sample_units(self) -> List[Tuple[int, Optional[List[Action]], Card, Tuple[int, ...], int, Set[object]]]:
+        """
+        Splits the actions of a normal turn into the disjoint units drawn by sample_action.
+        :return: list of (bound, listed actions or None, card, distances, square, keys of the listed actions)
+        """
+        state = self.state
+        units: List[Tuple[int, Optional[List[Action]], Card, Tuple[int, ...], int, Set[object]]] = []
+        positions = list(dict.fromkeys(m.pos for m in self._get_player_marbles()))
+        for card in dict.fromkeys(canonical_card(c) for c in state.list_player[state.idx_player_active].list_card):
+            distances: Tuple[int, ...] = ()
+            rules = self._rules_of(card)
+            if rules.swaps or (rules.wildcard and state.cnt_round == 0):
+                listed = self._get_actions_for_card(card)
+            else:
+                if not rules.distances:
+                    continue
+                distances = rules.distances
+                listed = self._get_start_actions(card)
+                if rules.wildcard:
+                    listed += self._get_joker_swap_actions(card, bool(listed))
+            unique = {a.key(): a for a in listed}
+            listed_keys: Set[object] = set(unique)
+            if unique:
+                units.append((len(unique), list(unique.values()), card, distances, -1, listed_keys))
+            for pos in positions if distances else []:
+                if pos < self.MAIN_PATH_LENGTH or rules.can_start:
+                    units.append((len(distances), None, card, distances, pos, listed_keys))
+        return units
+
+    def _sample_unit_actions(self, unit: Tuple[int, Optional[List[Action]], Card, Tuple[int, ...], int, Set[object]]
+                             ) -> List[Action]:
+        _, listed, card, distances, pos, listed_keys = unit
+        if listed is not None:
+            return listed
+        moves = {a.key(): a for a in self._get_cached_moves_from(card, distances, pos)}
+        return [a for k, a in moves.items() if k not in listed_keys]
+
+    def get_list_choice(self) -> List[ActionChoice]:
+        """
+        First level of the factorized action space: the cards the active player can play, a joker split by the
+        card it is swapped for and moves split by their distance. get_list_action_for_choice yields the second
+        level; together they hold the actions of get_list_action without building all of them at once.
+        :return: list of choices with at least one legal action
+        """
+        assert self.state is not None
+        self._sync_board()
+        choices: List[ActionChoice] = []
+        for card in self._get_choice_cards():
+            if self._get_actions_without_distance(card):
+                choices.append(ActionChoice(card=card))
+            choices.extend(ActionChoice(card=card, card_swap=a.card_swap) for a in self._get_choice_swap_actions(card))
+            choices.extend(ActionChoice(card=card, distance=distance) for distance in self._get_choice_distances(card)
+                           if self._has_action_with_distance(card, distance))
+        return choices
+
+    def get_list_action_for_choice(self, choice: ActionChoice) -> List[Action]:
+        """
+        Second level of the factorized action space: the legal actions with the card, swap and distance of a choice.
+        :param choice: choice, usually one of get_list_choice
+        :return: sorted list of unique actions, empty if the choice is not legal
+        """
+        assert self.state is not None
+        self._sync_board()
+        card = canonical_card(choice.card)
+        actions: List[Action] = []
+        if card not in self._get_choice_cards():
+            return actions
+        if choice.card_swap is not None:
+            actions = [a for a in self._get_choice_swap_actions(card) if a.card_swap == choice.card_swap]
+        elif choice.distance is None:
+            actions = self._get_actions_without_distance(card)
+        elif choice.distance in self._get_choice_distances(card):
+            actions = self._get_actions_with_distance(card, choice.distance)
+        return self._unique_sorted_actions(actions)
+
+    def _is_exchange_turn(self) -> bool:
+        state = self.state
+        return state.cnt_round == 0 and state.card_active is None and not state.bool_card_exchanged
+
+    def _get_choice_cards(self) -> List[Card]:
+        state = self.state
+        if state.card_active is not None:
+            return [canonical_card(state.card_active)]
+        return list(dict.fromkeys(canonical_card(c) for c in state.list_player[state.idx_player_active].list_card))
+
+    def _get_actions_without_distance(self, card: Card) -> List[Action]:
+        if self._is_exchange_turn():
+            return [Action(card=card, pos_from=None, pos_to=None)]
+        if self.state.card_active is not None:
+            return []
+        if self._rules_of(card).swaps:
+            return self._get_jack_actions(card)
+        return self._get_start_actions(card)
+
+    def _get_choice_swap_actions(self, card: Card) -> List[Action]:
+        if not self._rules_of(card).wildcard or self.state.card_active is not None or self._is_exchange_turn():
+            return []
+        return self._get_joker_swap_actions(card, bool(self._get_start_actions(card)))
+
+    def _get_choice_distances(self, card: Card) -> List[int]:
+        state = self.state
+        rules = self._rules_of(card)
+        if self._is_exchange_turn() or rules.swaps:
+            return []
+        if state.card_active is None:
+            if rules.wildcard and state.cnt_round == 0:
+                return []
+        elif rules.splits:
+            return self._get_seven_distances()[0]
+        return list(rules.distances)
+
+    def _get_actions_with_distance(self, card: Card, distance: int) -> List[Action]:
+        if self.state.card_active is not None and self._rules_of(card).splits:
+            return self._get_actions_for_seven_card(distance)
+        return self._get_standard_actions(card, distance)
+
+    def _has_action_with_distance(self, card: Card, distance: int) -> bool:
+        """ Like _get_actions_with_distance, but stops at the first square with a legal move """
+        if self.state.card_active is not None and self._rules_of(card).splits:
+            return bool(self._get_actions_for_seven_card(distance))
+        backward = self._rules_of(self.state.card_active).backward
+        positions = dict.fromkeys(m.pos for i in self._controlled_player_indices()
+                                  for m in self.state.list_player[i].list_marble)
+        return any(self._get_cached_moves_from(card, (distance,), pos, backward) for pos in positions)
+
+    def _generate_list_action(self) -> List[Action]:
+        if self._rules_of(self.state.card_active).splits:
+            return self._get_actions_for_seven_card()
+        return self._unique_sorted_actions(list(self._iter_raw_actions()))
+
+    def _unique_sorted_actions(self, actions: List[Action]) -> List[Action]:
+        unique: Dict[Tuple[object, Optional[int], Optional[int], object], Action] = {}
+        for a in actions:
+            unique.setdefault(a.key(), a)
+        keyed: List[Tuple[Tuple[int, int, int, int], Action]] = []
+        for a in unique.values():
+            sort_key = a.sort_key()
+            if sort_key is None:
+                # cards outside of the deck, sort by their string representation
+                return sorted(unique.values(), key=lambda x: (
+                    str(x.card),
+                    x.pos_from if x.pos_from is not None else -999,
+                    x.pos_to if x.pos_to is not None else -999,
+                    str(x.card_swap) if x.card_swap else ''
+                ))
+            keyed.append((sort_key, a))
+        keyed.sort(key=lambda x: x[0])
+        return [a for _, a in keyed]
+
+    def get_move_distance(self, card: Card) -> Optional[Union[int, List[int]]]:
+        rules = self.RANK_MOVES.get(card.rank)
+        return rules.move_distance if rules is not None else None
+
+    def successors(self) -> List[Tuple[Optional[Action], Tuple[MarbleJournal.Entry, ...]]]:
+        """
+        Resulting board of every legal action, for bots that evaluate positions. The board is given as the
+        marbles the action changes, (player index, marble index, new position, new is_save flag) sorted by
+        player and marble. Without legal action the pass (None) is the only successor.
+        Card actions are resolved on the position index without touching the state, the kennel square of a
+        knocked out marble is looked up once per player. A pass can roll back a seven, it is applied with
+        push_action and undone, and the random generator is restored afterwards.
+        :return: list of (action, changed marbles)
+        """
+        assert self.state is not None
+        list_action: List[Optional[Action]] = list(self.get_list_action()) or [None]
+        kennel_spots: Dict[int, Optional[int]] = {}
+        rng: Any = self.rng if self.rng is not None else random
+        rng_state: Optional[object] = None
+        result: List[Tuple[Optional[Action], Tuple[MarbleJournal.Entry, ...]]] = []
+        try:
+            for action in list_action:
+                if self.rules_override is None and action is not None and action.card is not None:
+                    result.append((action, self._successor_of_move(action, kennel_spots)))
+                else:
+                    if rng_state is None:
+                        rng_state = rng.getstate()
+                    result.append((action, self._successor_by_push(action)))
+        finally:
+            if rng_state is not None:
+                rng.setstate(rng_state)
+        return result
+
+    def _successor_of_move(self, action: Action, kennel_spots: Dict[int, Optional[int]]
+                           ) -> Tuple[MarbleJournal.Entry, ...]:
+        """
+        Marbles changed by a move, the same way _move_marble changes them, with the changes kept in an overlay.
+        :param action: move with a card, the card is not played
+        :param kennel_spots: first free kennel square per player on the unchanged board, filled on demand
+        :return: changed marbles
+        """
+        if action.pos_from is None or action.pos_to is None:
+            return ()  # card exchange
+        rules = self._rules_of(action.card)
+        if rules.wildcard and action.card_swap is not None:
+            return ()
+        pos_from, pos_to = action.pos_from, action.pos_to
+        if self._calc_steps(pos_from, pos_to, self.state.idx_player_active) is None:
+            return ()
+        if rules.swaps:
+            return self._successor_of_swap(pos_from, pos_to)
+        moved: Dict[Tuple[int, int], Tuple[int, bool]] = {}
+        if rules.splits or self._rules_of(self.state.card_active).splits:
+            self._successor_seven_knock_outs(moved, kennel_spots, pos_from, pos_to)
+        located = self._overlay_occupants(moved, pos_from)
+        if located:
+            mover = located[0]
+            self._successor_knock_out(moved, kennel_spots, pos_to, mover)
+            is_save = moved.get(mover, (pos_from, self._board_save[mover[0]][mover[1]]))[1]
+            start = self.PLAYER_BOARD_SEGMENTS[self.state.idx_player_active]['start']
+            moved[mover] = (pos_to, is_save or pos_to == start)
+        return tuple(sorted((p_idx, m_idx, pos, is_save) for (p_idx, m_idx), (pos, is_save) in moved.items()
+                            if (self._board_pos[p_idx][m_idx], self._board_save[p_idx][m_idx]) != (pos, is_save)))
+
+    def _successor_of_swap(self, pos_from: int, pos_to: int) -> Tuple[MarbleJournal.Entry, ...]:
+        """ Marbles changed by a jack swapping the marbles on pos_from and pos_to, like _move_marble """
+        fm = self._locate_marble(pos_from)
+        tm = self._locate_marble(pos_to)
+        if not (fm and tm and fm != tm):
+            return ()
+        return tuple(sorted([(fm[0], fm[1], pos_to, self._board_save[fm[0]][fm[1]]),
+                             (tm[0], tm[1], pos_from, self._board_save[tm[0]][tm[1]])]))
+
+    def _successor_seven_knock_outs(self, moved: Dict[Tuple[int, int], Tuple[int, bool]],
+                                    kennel_spots: Dict[int, Optional[int]], pos_from: int, pos_to: int) -> None:
+        """ Knocks out every marble a seven passes, like _handle_seven_move """
+        final_start = self.PLAYER_BOARD_SEGMENTS[self.state.idx_player_active]['final_start']
+        dist_val = pos_to - pos_from if pos_from >= final_start else (pos_to - pos_from) % self.MAIN_PATH_LENGTH
+        direction = 1 if dist_val >= 0 else -1
+        for step in range(1, abs(dist_val) + 1):
+            self._successor_knock_out(moved, kennel_spots, (pos_from + step * direction) % self.MAIN_PATH_LENGTH)
+
+    def _overlay_occupants(self, moved: Dict[Tuple[int, int], Tuple[int, bool]], pos: int) -> List[Tuple[int, int]]:
+        occupants = self._occupants(pos)
+        if not moved:
+            return occupants
+        return sorted([o for o in occupants if o not in moved] + [o for o, (p, _) in moved.items() if p == pos])
+
+    def _successor_knock_out(self, moved: Dict[Tuple[int, int], Tuple[int, bool]],
+                             kennel_spots: Dict[int, Optional[int]], pos: int,
+                             mover: Optional[Tuple[int, int]] = None) -> None:
+        """ Sends the first marble on pos to its kennel like _send_to_kennel, unless it is save or equals the mover """
+        occupants = self._overlay_occupants(moved, pos)
+        if not occupants:
+            return
+        kp, ki = occupants[0]
+        value = moved.get((kp, ki), (self._board_pos[kp][ki], self._board_save[kp][ki]))
+        if mover is not None and value == moved.get(mover, (self._board_pos[mover[0]][mover[1]],
+                                                            self._board_save[mover[0]][mover[1]])):
+            return
+        segment = self.PLAYER_BOARD_SEGMENTS[kp]
+        in_final = segment['final_start'] <= pos < segment['final_start'] + 4
+        if value[1] and (pos == segment['start'] or in_final):
+            return
+        kennel = range(segment['queue_start'], segment['queue_start'] + 4)
+        if moved:
+            spot = next((sq for sq in kennel if all(p_i != kp for p_i, _ in self._overlay_occupants(moved, sq))), None)
+        else:
+            if kp not in kennel_spots:
+                kennel_spots[kp] = next((sq for sq in kennel if all(p_i != kp for p_i, _ in self._occupants(sq))),
+                                        None)
+            spot = kennel_spots[kp]
+        if spot is not None:
+            moved[(kp, ki)] = (spot, False)
+
+    def _successor_by_push(self, action: Optional[Action]) -> Tuple[MarbleJournal.Entry, ...]:
+        self.push_action(action)
+        try:
+            before: Dict[Tuple[int, int], Tuple[int, bool]] = {}
+            for p_idx, m_idx, pos, is_save in self._action_stack[-1].entries:
+                before.setdefault((p_idx, m_idx), (pos, is_save))
+            return tuple(sorted(
+                (p_idx, m_idx, self._board_pos[p_idx][m_idx], self._board_save[p_idx][m_idx])
+                for (p_idx, m_idx), old in before.items()
+                if (self._board_pos[p_idx][m_idx], self._board_save[p_idx][m_idx]) != old))
+        finally:
+            self.pop_action()
@@ -0,0 +1,42 @@
+from typing import ClassVar, Dict, List, Optional, Tuple, Union
+
+
+class RankMoves:
+    """
+    Move rules of one card rank, compiled once from the option tables of Dog into Dog.RANK_MOVES.
+    generator and handler name the Dog methods that list and apply the moves of the rank; they are looked up
+    on the game, so subclasses and the stats wrappers of Dog.enable_stats take effect. The flags mark the
+    special ranks, so the engine does not compare rank strings: the jack swaps marbles, the joker stands in for
+    another card and the seven splits its distance.
+    """
+    START_RANKS: ClassVar[Tuple[str, ...]] = ('A', 'K', 'JKR')
+    GENERATORS: ClassVar[Dict[str, str]] = {'J': '_generate_jack', 'JKR': '_generate_joker'}
+    HANDLERS: ClassVar[Dict[str, str]] = {'7': '_handle_card_7', 'JKR': '_handle_card_joker', 'J': '_handle_card_j'}
+
+    def __init__(self, rank: str, move_distance: Optional[Union[int, List[int]]]) -> None:
+        self.rank = rank
+        # as returned by Dog.get_move_distance, and as tuple for the move generation
+        self.move_distance = move_distance
+        self.distances: Tuple[int, ...] = ()
+        if move_distance is not None:
+            self.distances = tuple(move_distance) if isinstance(move_distance, list) else (move_distance,)
+        self.can_start = rank in self.START_RANKS
+        self.backward = rank == '4'
+        self.swaps = rank == 'J'
+        self.wildcard = rank == 'JKR'
+        self.splits = rank == '7'
+        self.generator = self.GENERATORS.get(rank, '_generate_moves')
+        self.handler = self.HANDLERS.get(rank, '_handle_card_other')
+
+    @classmethod
+    def compile(cls, card_movements: Dict[str, Optional[int]], ace_options: List[int], seven_options: List[int],
+                joker_options: List[int]) -> Dict[str, 'RankMoves']:
+        table = {rank: cls(rank, dist) for rank, dist in card_movements.items()}
+        table['A'] = cls('A', ace_options)
+        table['7'] = cls('7', seven_options)
+        table['JKR'] = cls('JKR', joker_options)
+        return table
+
+
+# rules of no card or of a rank without rules: no moves, no special flags
+NO_RANK_MOVES = RankMoves('', None)
@@ -0,0 +1,204 @@
+from typing import Any, List, Optional, Tuple
+from bisect import bisect_right
+import random
+from server.py.dog import Action, Dog, GameState
+
+
+def encode_varint(value: int, data: bytearray) -> None:
+    """
+    Appends an unsigned integer in 7 bit groups, the high bit marks that another group follows.
+    :raises ValueError: for negative values
+    """
+    if value < 0:
+        raise ValueError(f'varint must not be negative: {value}')
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+def decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    Reads an unsigned integer written by encode_varint.
+    :return: value and offset behind it
+    :raises ValueError: if the data ends within the value
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError('truncated varint')
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, offset
+
+
+class GameRecord:
+    """
+    Compact record of a Dog game: the seed of the random generator of the game, optionally the state it
+    started from, and per move a varint with the index of the action in get_list_action, shifted by one,
+    0 stands for None. The shuffles of the game are replayed from the seed, so a record is only valid for
+    the engine version which wrote it. Games with a rules override cannot be recorded.
+    """
+
+    VERSION = 1
+    CODE_NONE = 0
+
+    def __init__(self, seed: int, state: Optional[GameState] = None, cnt_players: int = 4) -> None:
+        self.seed = seed
+        self.state = state
+        self.cnt_players = cnt_players
+        self.list_code: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.list_code)
+
+    def new_game(self) -> Dog:
+        """
+        Creates the game the record starts from, to be played while recording.
+        :return: new game with a random generator seeded from the record
+        """
+        game = Dog(cnt_players=self.cnt_players, rng=random.Random(self.seed))
+        if self.state is not None:
+            game.set_state(self.state.snapshot())
+        return game
+
+    def append(self, game: Dog, action: Optional[Action]) -> None:
+        """
+        Records an action, call it before the action is applied to the game.
+        :param game: game created by new_game
+        :param action: action about to be applied
+        :raises ValueError: if the action is not in the list of legal actions
+        """
+        if action is None:
+            self.list_code.append(self.CODE_NONE)
+            return
+        keys = [a.key() for a in game.get_list_action()]
+        if action.key() not in keys:
+            raise ValueError(f'{action} is not a legal action')
+        self.list_code.append(keys.index(action.key()) + 1)
+
+    def replay(self, cnt_moves: Optional[int] = None) -> Dog:
+        """
+        Replays the record from the start.
+        :param cnt_moves: number of moves to replay, all if None
+        :return: game after the moves
+        :raises ValueError: if a move does not match the legal actions of the game
+        """
+        game = self.new_game()
+        for code in self.list_code[:cnt_moves]:
+            game.apply_action(self.decode_action(game, code))
+        return game
+
+    def decode_action(self, game: Dog, code: int) -> Optional[Action]:
+        """
+        Returns the action a move code stands for in the current state of a game.
+        :raises ValueError: if the code does not match the legal actions of the game
+        """
+        if code == self.CODE_NONE:
+            return None
+        actions = game.get_list_action()
+        if code > len(actions):
+            raise ValueError(f'action {code - 1} of {len(actions)} recorded, engine mismatch')
+        return actions[code - 1]
+
+    def to_bytes(self) -> bytes:
+        """
+        Encodes the record: version, cnt_players, seed, length of the start state (0 for none), start state
+        (see GameState.to_bytes) and the move codes, all as varints.
+        :return: encoded record
+        """
+        data = bytearray([self.VERSION])
+        encode_varint(self.cnt_players, data)
+        encode_varint(self.seed, data)
+        state = self.state.to_bytes() if self.state is not None else b''
+        encode_varint(len(state), data)
+        data += state
+        for code in self.list_code:
+            encode_varint(code, data)
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'GameRecord':
+        """
+        Decodes a record encoded by to_bytes.
+        :raises ValueError: if the data is not a valid record
+        """
+        if not data or data[0] != cls.VERSION:
+            raise ValueError('unknown record version')
+        cnt_players, offset = decode_varint(data, 1)
+        seed, offset = decode_varint(data, offset)
+        size, offset = decode_varint(data, offset)
+        state = GameState.from_bytes(data[offset:offset + size]) if size else None
+        record = cls(seed, state, cnt_players)
+        offset += size
+        while offset < len(data):
+            code, offset = decode_varint(data, offset)
+            record.list_code.append(code)
+        return record
+
+
+class GameReplay:
+    """
+    Replays a GameRecord with checkpoints at the round boundaries, taken while replaying forward. seek restores
+    the nearest checkpoint before the target and applies only the moves after it. A checkpoint holds the encoded
+    state, the state of the random generator and the turn counter of the round, so the shuffles replay exactly.
+    """
+
+    def __init__(self, record: GameRecord) -> None:
+        self.record = record
+        self.game = record.new_game()
+        self.idx_move = 0
+        # (Anzahl angewendeter Züge, Zustand, Zustand des Zufallsgenerators, Züge in der aktuellen Runde)
+        self.checkpoints: List[Tuple[int, bytes, Any, int]] = []
+
+    def seek(self, idx_move: int) -> Dog:
+        """
+        Moves the replay to the state after the given number of moves.
+        :param idx_move: number of moves, 0 .. len(record)
+        :return: game after the moves, owned by the replay and changed by the next seek
+        :raises ValueError: if idx_move is out of range or a move does not match the engine
+        """
+        if not 0 <= idx_move <= len(self.record):
+            raise ValueError(f'move {idx_move} out of range 0..{len(self.record)}')
+        idx_checkpoint = bisect_right([c[0] for c in self.checkpoints], idx_move) - 1
+        idx_start = self.checkpoints[idx_checkpoint][0] if idx_checkpoint >= 0 else 0
+        if idx_move < self.idx_move or idx_start > self.idx_move:
+            if idx_checkpoint >= 0:
+                self._restore(self.checkpoints[idx_checkpoint])
+            else:
+                self.game = self.record.new_game()
+                self.idx_move = 0
+        while self.idx_move < idx_move:
+            game = self.game
+            cnt_round = game.state.cnt_round
+            game.apply_action(self.record.decode_action(game, self.record.list_code[self.idx_move]))
+            self.idx_move += 1
+            if game.state.cnt_round != cnt_round and (not self.checkpoints or self.idx_move > self.checkpoints[-1][0]):
+                self._add_checkpoint()
+        return self.game
+
+    def _add_checkpoint(self) -> None:
+        game = self.game
+        if (game.state.card_active is not None or game.temp_seven_moves is not None or
+                game.temp_seven_card is not None or game.temp_joker_card is not None or
+                game.temp_seven_journal is not None):
+            return
+        assert game.rng is not None
+        self.checkpoints.append(
+            (self.idx_move, game.state.to_bytes(), game.rng.getstate(), game.turns_in_current_round))
+
+    def _restore(self, checkpoint: Tuple[int, bytes, Any, int]) -> None:
+        idx_move, data, rng_state, turns_in_current_round = checkpoint
+        game = self.game
+        game.set_state(GameState.from_bytes(data))
+        game.temp_seven_moves = None
+        game.temp_seven_card = None
+        game.temp_joker_card = None
+        game.temp_seven_journal = None
+        assert game.rng is not None
+        game.rng.setstate(rng_state)
+        game.turns_in_current_round = turns_in_current_round
+        self.idx_move = idx_move
@@ -0,0 +1,55 @@
+from typing import Any, Callable, Dict
+from time import perf_counter
+
+
+class EngineStats:
+    """
+    Call counters and timers for the hot paths of a Dog game, enabled with Dog.enable_stats.
+    The time of a method includes the instrumented methods it calls.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        # Anzahl Aufrufe von get_list_action je Länge der Liste
+        self.action_list_sizes: Dict[int, int] = {}
+
+    @staticmethod
+    def instrument(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wraps an unbound method of Dog, the calls are recorded in the stats of the game they are made on.
+        :param name: name to record the calls under
+        :param func: function to wrap
+        :return: wrapper, to be bound to the game
+        """
+        def wrapper(game: Any, *args: Any, **kwargs: Any) -> Any:
+            time_start = perf_counter()
+            try:
+                result = func(game, *args, **kwargs)
+            finally:
+                stats = game.stats
+                if stats is not None:
+                    stats.calls[name] = stats.calls.get(name, 0) + 1
+                    stats.seconds[name] = stats.seconds.get(name, 0.0) + perf_counter() - time_start
+            if name == 'get_list_action' and stats is not None:
+                stats.action_list_sizes[len(result)] = stats.action_list_sizes.get(len(result), 0) + 1
+            return result
+        return wrapper
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.seconds.clear()
+        self.action_list_sizes.clear()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of the stats.
+        :return: dict with the calls and seconds per method, the number of round transitions and the histogram
+            of the sizes of the action lists
+        """
+        return {
+            'calls': dict(self.calls),
+            'seconds': dict(self.seconds),
+            'round_transitions': self.calls.get('setup_next_round', 0),
+            'action_list_sizes': dict(sorted(self.action_list_sizes.items())),
+        }
@@ -0,0 +1,198 @@
+from typing import ClassVar, Dict, Optional, Tuple
+
+
+class MoveTables:
+    """
+    Lookup tables for marble moves of every player. Targets only depend on the board layout and are built
+    once when the module is loaded. Traversed squares and step counts are memoized per (four, player, pos_from,
+    pos_to) on first use, as only few of these pairs are ever asked for. Move generation reduces to table
+    lookups plus occupancy checks. Arguments outside the board fall back to the arithmetic.
+    """
+    MAX_DISTANCE: ClassVar[int] = 13
+    AREA_KENNEL: ClassVar[int] = 0
+    AREA_TRACK: ClassVar[int] = 1
+    AREA_FINISH: ClassVar[int] = 2
+
+    Path = Tuple[Tuple[int, ...], Tuple[int, ...]]
+
+    def __init__(self, segments: Dict[int, Dict[str, int]], path_length: int, board_size: int) -> None:
+        self.segments = segments
+        self.path_length = path_length
+        self.board_size = board_size
+        self._runs: Dict[Tuple[int, int, int], Tuple[int, ...]] = {}
+        players = range(len(segments))
+        squares = range(board_size)
+        distances = range(-self.MAX_DISTANCE, self.MAX_DISTANCE + 1)
+        # area[player][pos] = AREA_KENNEL, AREA_TRACK, AREA_FINISH or None for the other players' squares
+        self.area = tuple(tuple(self.calc_area(p, pos) for pos in squares) for p in players)
+        # target[player][pos_from][dist + MAX_DISTANCE], negative distances move backwards (card 4)
+        self.target = tuple(
+            tuple(tuple(self.calc_pos_to(p, pos, dist, dist < 0) for dist in distances) for pos in squares)
+            for p in players)
+        # per (four, player, pos_from, pos_to) on the board: (squares on main path, squares in finish lane) or
+        # None, the path as (bits of the main path squares, bits of the finish squares) and the step count
+        self._path: Dict[Tuple[bool, int, int, int], Optional[MoveTables.Path]] = {}
+        self._path_mask: Dict[Tuple[bool, int, int, int], Optional[Tuple[int, int]]] = {}
+        self._steps: Dict[Tuple[bool, int, int, int], Optional[int]] = {}
+
+    def calc_area(self, player_idx: int, pos: int) -> Optional[int]:
+        queue_start = self.segments[player_idx]['queue_start']
+        final_start = self.segments[player_idx]['final_start']
+        if queue_start <= pos < queue_start + 4:
+            return self.AREA_KENNEL
+        if final_start <= pos < final_start + 4:
+            return self.AREA_FINISH
+        if 0 <= pos < self.path_length:
+            return self.AREA_TRACK
+        return None
+
+    def count_steps_to_finish(self, pos_from: int, start: int, final_start: int) -> int:
+        if final_start < self.path_length:
+            pf = pos_from
+            if pf < start:
+                pf += self.path_length
+            return (final_start - pf) % self.path_length
+        pf = pos_from
+        if pf < start:
+            dist_to_loop_end = self.path_length - pf
+            dist_finish = final_start - self.path_length
+            return dist_to_loop_end + dist_finish
+        dist_main = self.path_length - pf
+        dist_finish = final_start - self.path_length
+        return dist_main + dist_finish
+
+    def calc_pos_to(self, player_idx: int, pos_from: int, dist: int, backward: bool) -> Optional[int]:
+        start = self.segments[player_idx]['start']
+        final_start = self.segments[player_idx]['final_start']
+        pos_new: Optional[int] = None
+        if backward and dist < 0:
+            pos_test = (pos_from + dist) % self.path_length
+            pos_new = None if pos_test >= self.path_length else pos_test
+        elif pos_from < self.path_length:
+            steps_to_finish = self.count_steps_to_finish(pos_from, start, final_start)
+            if 0 < dist <= steps_to_finish:
+                diff = dist - steps_to_finish
+                pos_test = final_start + diff
+                pos_new = None if pos_test >= final_start + 4 else pos_test
+            else:
+                pos_new = (pos_from + dist) % self.path_length
+        else:
+            pos_test = pos_from + dist
+            pos_new = None if (pos_test < final_start or pos_test >= final_start + 4) else pos_test
+        return pos_new
+
+    def _run(self, pos_from: int, steps: int, direction: int) -> Tuple[int, ...]:
+        key = (pos_from, steps, direction)
+        run = self._runs.get(key)
+        if run is None:
+            run = tuple((pos_from + direction * i) % self.path_length for i in range(1, steps + 1))
+            self._runs[key] = run
+        return run
+
+    def calc_path(self, player_idx: int, pos_from: int, pos_to: int, four: bool) -> Optional[Path]:
+        """
+        Squares a marble passes when moving from pos_from to pos_to.
+        :return: (main path squares that must not hold a save marble, finish squares that must be empty)
+                 or None if the move can never be made
+        """
+        if pos_to < self.path_length <= pos_from:
+            return None
+        fs = self.segments[player_idx]['final_start']
+        st = self.segments[player_idx]['start']
+        dist = (pos_to - pos_from) % self.path_length
+        direction = 1
+        if four:
+            bd = (pos_from - pos_to) % self.path_length
+            fd = (pos_to - pos_from) % self.path_length
+            if bd == 4:
+                direction = -1
+                dist = 4
+            elif fd == 4:
+                dist = 4
+        if pos_to < fs:
+            path: MoveTables.Path = (self._run(pos_from, dist, direction), ())
+        else:
+            stf = self.count_steps_to_finish(pos_from, st, fs)
+            if dist <= stf:
+                path = (self._run(pos_from, dist, 1), ())
+            else:
+                path = (self._run(pos_from, stf, 1), tuple(range(fs, fs + dist - stf)))
+        return path
+
+    def calc_path_mask(self, path: Optional[Path]) -> Optional[Tuple[int, int]]:
+        """ Path as bit masks, bit n stands for board square n """
+        if path is None:
+            return None
+        return sum(1 << sq for sq in set(path[0])), sum(1 << sq for sq in path[1])
+
+    def calc_steps(self, player_idx: int, pos_from: int, pos_to: int, four: bool) -> Optional[int]:
+        final_start = self.segments[player_idx]['final_start']
+        start = self.segments[player_idx]['start']
+        queue_start = self.segments[player_idx]['queue_start']
+        result: Optional[int] = None
+        if queue_start <= pos_from <= queue_start + 3 and pos_to == start:
+            result = 1
+        elif pos_from >= final_start:
+            if pos_to < final_start or pos_to < pos_from:
+                result = None
+            else:
+                result = pos_to - pos_from
+        elif pos_to >= final_start:
+            steps_finish = self.count_steps_to_finish(pos_from, start, final_start)
+            diff = pos_to - final_start
+            if diff < 0 or diff > 3:
+                result = None
+            else:
+                result = steps_finish + diff
+        elif four:
+            d = (pos_to - pos_from) % self.path_length
+            d2 = (pos_from - pos_to) % self.path_length
+            result = -4 if d2 == 4 else (4 if d == 4 else None)
+        else:
+            dist = (pos_to - pos_from) % self.path_length
+            result = dist if dist != 0 else None
+        return result
+
+    def pos_to_of(self, player_idx: int, pos_from: int, dist: int, backward: bool) -> Optional[int]:
+        if 0 <= pos_from < self.board_size and -self.MAX_DISTANCE <= dist <= self.MAX_DISTANCE and (
+                dist >= 0 or backward):
+            return self.target[player_idx][pos_from][dist + self.MAX_DISTANCE]
+        return self.calc_pos_to(player_idx, pos_from, dist, backward)
+
+    def path_of(self, player_idx: int, pos_from: int, pos_to: int, four: bool) -> Optional[Path]:
+        key = (four, player_idx, pos_from, pos_to)
+        try:
+            return self._path[key]
+        except KeyError:
+            pass
+        path = self.calc_path(player_idx, pos_from, pos_to, four)
+        if 0 <= pos_from < self.board_size and 0 <= pos_to < self.board_size:
+            self._path[key] = path
+        return path
+
+    def path_mask_of(self, player_idx: int, pos_from: int, pos_to: int, four: bool) -> Optional[Tuple[int, int]]:
+        key = (four, player_idx, pos_from, pos_to)
+        try:
+            return self._path_mask[key]
+        except KeyError:
+            pass
+        masks = self.calc_path_mask(self.path_of(player_idx, pos_from, pos_to, four))
+        if 0 <= pos_from < self.board_size and 0 <= pos_to < self.board_size:
+            self._path_mask[key] = masks
+        return masks
+
+    def area_of(self, player_idx: int, pos: int) -> Optional[int]:
+        if 0 <= pos < self.board_size:
+            return self.area[player_idx][pos]
+        return self.calc_area(player_idx, pos)
+
+    def steps_of(self, player_idx: int, pos_from: int, pos_to: int, four: bool) -> Optional[int]:
+        key = (four, player_idx, pos_from, pos_to)
+        try:
+            return self._steps[key]
+        except KeyError:
+            pass
+        steps = self.calc_steps(player_idx, pos_from, pos_to, four)
+        if 0 <= pos_from < self.board_size and 0 <= pos_to < self.board_size:
+            self._steps[key] = steps
+        return steps
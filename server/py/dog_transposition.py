@@ -0,0 +1,136 @@
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+import random
+from server.py.dog_model import Card
+
+
+def mix64(value: int) -> int:
+    """
+    Scrambles an integer into a 64 bit key (splitmix64 finalizer), for values without a precomputed key.
+    :param value: integer to scramble
+    :return: 64 bit key
+    """
+    value = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+class ZobristKeys:
+    """
+    Random 64 bit keys for Zobrist hashing of Dog states. The keys are drawn from a fixed seed, so a state
+    hashes the same in every process. Hands are hashed as multisets: the k-th copy of a card has its own key.
+    """
+    MAX_COPIES: ClassVar[int] = 8
+    SEED: ClassVar[int] = 0x5EED_D06
+
+    def __init__(self, cnt_players: int, cnt_marbles: int, board_size: int) -> None:
+        rng = random.Random(self.SEED)
+        self.board_size = board_size
+        # marble[player][marble][pos], save[player][marble]
+        self.marble = [[[rng.getrandbits(64) for _ in range(board_size)] for _ in range(cnt_marbles)]
+                       for _ in range(cnt_players)]
+        self.save = [[rng.getrandbits(64) for _ in range(cnt_marbles)] for _ in range(cnt_players)]
+        # card[player][ordinal][copy], the last ordinal stands for cards outside of the deck
+        self.card = [[[rng.getrandbits(64) for _ in range(self.MAX_COPIES)] for _ in range(Card.CNT_ORDINAL + 1)]
+                     for _ in range(cnt_players)]
+        self.card_active = [rng.getrandbits(64) for _ in range(Card.CNT_ORDINAL + 1)]
+        self.player_active = [rng.getrandbits(64) for _ in range(cnt_players)]
+        self.card_exchanged = rng.getrandbits(64)
+        self.salt_round = rng.getrandbits(64)
+        self.salt_seven = rng.getrandbits(64)
+        self.salt_marble = rng.getrandbits(64)
+
+    def marble_key(self, p_idx: int, m_idx: int, pos: int) -> int:
+        if 0 <= pos < self.board_size and p_idx < len(self.marble) and m_idx < len(self.marble[p_idx]):
+            return self.marble[p_idx][m_idx][pos]
+        return mix64(self.salt_marble ^ (p_idx << 48) ^ (m_idx << 40) ^ (pos & 0xFFFFFFFFFF))
+
+    def save_key(self, p_idx: int, m_idx: int) -> int:
+        if p_idx < len(self.save) and m_idx < len(self.save[p_idx]):
+            return self.save[p_idx][m_idx]
+        return mix64(self.salt_marble ^ (p_idx << 48) ^ (m_idx << 40) ^ (1 << 39))
+
+    def card_key(self, p_idx: int, card: Card, copy_idx: int) -> int:
+        ordinal = card.ordinal
+        return self.card[p_idx % len(self.card)][Card.CNT_ORDINAL if ordinal is None else ordinal][
+            copy_idx % self.MAX_COPIES]
+
+    def hand_key(self, p_idx: int, list_card: List[Card]) -> int:
+        """
+        Hashes a hand from scratch.
+        :param p_idx: index of the player holding the hand
+        :param list_card: cards of the hand
+        :return: 64 bit key
+        """
+        key = 0
+        counts: Dict[Card, int] = {}
+        for card in list_card:
+            copy_idx = counts.get(card, 0)
+            counts[card] = copy_idx + 1
+            key ^= self.card_key(p_idx, card, copy_idx)
+        return key
+
+
+class TranspositionTable:
+    """
+    Bounded table of search results keyed by Zobrist hashes, to be shared by bots and evaluators.
+    Every hash maps to one slot. A stored entry is replaced by a newer entry if it stems from an older
+    generation (see new_generation) or if the new entry was searched at least as deep, also for the same hash.
+    """
+
+    Entry = Tuple[int, int, int, Any]
+
+    def __init__(self, size_bits: int = 16) -> None:
+        self.size = 1 << size_bits
+        self._mask = self.size - 1
+        self._slots: List[Optional[TranspositionTable.Entry]] = [None] * self.size
+        self._cnt_entries = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def new_generation(self) -> None:
+        """
+        Marks all stored entries as old, e.g. before the next move is searched. Old entries stay readable.
+        :return: None
+        """
+        self.generation += 1
+
+    def lookup(self, key: int, depth: int = 0) -> Optional[Any]:
+        """
+        Returns the value stored for a hash if it was searched at least to the given depth.
+        :param key: Zobrist hash of the state
+        :param depth: minimal search depth of the stored value
+        :return: stored value or None
+        """
+        entry = self._slots[key & self._mask]
+        if entry is not None and entry[0] == key and entry[1] >= depth:
+            self.hits += 1
+            return entry[3]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value: Any, depth: int = 0) -> bool:
+        """
+        Stores a value if the replacement policy allows it.
+        :param key: Zobrist hash of the state
+        :param value: value to store
+        :param depth: search depth of the value
+        :return: True, if the value was stored
+        """
+        idx = key & self._mask
+        entry = self._slots[idx]
+        if entry is not None and entry[2] == self.generation and entry[1] > depth:
+            return False
+        if entry is None:
+            self._cnt_entries += 1
+        self._slots[idx] = (key, depth, self.generation, value)
+        return True
+
+    def clear(self) -> None:
+        self._slots = [None] * self.size
+        self._cnt_entries = 0
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return self._cnt_entries
@@ -265,15 +265,12 @@ async def dog_simulation_ws(websocket: WebSocket):
 
     try:
         game = dog.Dog()
-        player = dog.RandomPlayer()
+        player = dog.RandomPlayer(game)
 
         while True:
 
             state = game.get_state()
-            list_action = game.get_list_action()
-            action = None
-            if len(list_action) > 0:
-                action = player.select_action(state, list_action)
+            action = player.select_action(state, [])
 
             dict_state = state.model_dump()
             dict_state['idx_player_you'] = idx_player_you
@@ -308,7 +305,7 @@ async def dog_singleplayer_ws(websocket: WebSocket):
     try:
 
         game = dog.Dog()
-        player = dog.RandomPlayer()
+        player = dog.RandomPlayer(game)
 
         while True:
 
@@ -326,7 +323,7 @@ async def dog_singleplayer_ws(websocket: WebSocket):
                 data = {'type': 'update', 'state': dict_state}
                 await websocket.send_json(data)
 
-                if len(list_action) == 0:
+                if not list_action:
                     game.apply_action(None)
                 else:
                     data = await websocket.receive_json()
@@ -346,8 +343,7 @@ async def dog_singleplayer_ws(websocket: WebSocket):
             else:
 
                 state = game.get_player_view(state.idx_player_active)
-                list_action = game.get_list_action()
-                action = player.select_action(state, list_action)
+                action = player.select_action(state, [])
                 if action is not None:
                     await asyncio.sleep(1)
                 game.apply_action(action)
@@ -1,7 +1,14 @@
 import pytest
-from server.py.dog import (
-    Dog, Card, Marble, PlayerState, Action, GameState, GamePhase, RandomPlayer
+from server.py.dog import Dog, RandomPlayer, RulesOverride
+from server.py.dog_model import (
+    Card, Marble, PlayerState, Action, ActionChoice, GameState, GamePhase, MaskedGameState, LIST_CARD_DISTINCT,
+    get_card
 )
+from server.py.dog_tables import MoveTables
+from server.py.dog_rank_moves import RankMoves
+from server.py.dog_transposition import TranspositionTable
+from server.py.dog_journal import MarbleJournal
+from server.py.dog_record import GameRecord, GameReplay
 from server.py.game import Player
 import copy
 import random
@@ -11,6 +18,20 @@ def game():
     random.seed(8)  # Das Testszenario möglichst durch alle Pfade führen
     return Dog(cnt_players=4)
 
+def _play_random_plies(game, seed, plies, push=False):
+    """ Yields before each of up to plies random actions, so the caller can check every position on the way """
+    rng = random.Random(seed)
+    for ply in range(plies):
+        if game.get_state().phase == GamePhase.FINISHED:
+            break
+        yield ply
+        actions = game.get_list_action()
+        action = rng.choice(actions) if actions else None
+        if push:
+            game.push_action(action)
+        else:
+            game.apply_action(action)
+
 
 # =======================================================
 # Tests für Datenmodelle und Hilfsklassen
@@ -139,11 +160,12 @@ def test_get_standard_actions(game):
     assert isinstance(actions, list)
 
 def test_calc_pos_to(game):
-    pos_to = game._calc_pos_to(pos_from=0, dist=5, player_idx=0, rank='5')
-    assert pos_to is not None
+    pos_to = game.MOVE_TABLES.pos_to_of(0, 0, 5, False)
+    assert pos_to == 5
 
 def test_count_steps_to_finish(game):
-    steps = game._count_steps_to_finish(0, game.PLAYER_BOARD_SEGMENTS[0]['start'], game.PLAYER_BOARD_SEGMENTS[0]['final_start'])
+    segment = game.PLAYER_BOARD_SEGMENTS[0]
+    steps = game.MOVE_TABLES.count_steps_to_finish(0, segment['start'], segment['final_start'])
     assert isinstance(steps, int)
 
 def test_get_actions_for_seven_card(game):
@@ -305,7 +327,7 @@ def test_reset_card_active(game):
     assert game.temp_seven_moves is None
     assert game.temp_seven_card is None
     assert game.temp_joker_card is None
-    assert game.temp_seven_state is None
+    assert game.temp_seven_journal is None
 
 def test_find_player_card(game):
     p = game.state.list_player[0]
@@ -1231,26 +1253,12 @@ def test_ace_as_1_step_move(game):
                         and a.pos_from is not None and a.pos_to is not None]
     assert isinstance(one_step_actions, list)
 
-def test_count_steps_to_finish_with_modified_final_start(monkeypatch):
-    # Testet den Zweig in _count_steps_to_finish, wenn final_start < MAIN_PATH_LENGTH.
-    # Da dies im normalen Spiel nicht vorkommt, patchen wir PLAYER_BOARD_SEGMENTS.
-    game = Dog(cnt_players=4)
-    original_segments = copy.deepcopy(game.PLAYER_BOARD_SEGMENTS)
-    try:
-        # Patch für den ersten Spieler final_start auf 10 setzen, < MAIN_PATH_LENGTH (64)
-        modified_segments = copy.deepcopy(game.PLAYER_BOARD_SEGMENTS)
-        modified_segments[0]['final_start'] = 10
-        monkeypatch.setattr(game, 'PLAYER_BOARD_SEGMENTS', modified_segments)
-
-        start = modified_segments[0]['start']  # 0
-        final_start = modified_segments[0]['final_start']  # 10
-        steps = game._count_steps_to_finish(pos_from=5, start=start, final_start=final_start)
-        # Nur ein Check, dass wir keinen Fehler bekommen
-        assert isinstance(steps, int), "Steps sollte ein int sein."
-
-    finally:
-        # Wiederherstellen des Originalzustands
-        monkeypatch.setattr(game, 'PLAYER_BOARD_SEGMENTS', original_segments)
+def test_count_steps_to_finish_with_modified_final_start():
+    # Testet den Zweig in count_steps_to_finish, wenn final_start < MAIN_PATH_LENGTH.
+    # Das kommt im normalen Spiel nicht vor, final_start wird direkt übergeben.
+    steps = Dog.MOVE_TABLES.count_steps_to_finish(pos_from=5, start=0, final_start=10)
+    assert steps == 5
+    assert Dog.MOVE_TABLES.count_steps_to_finish(pos_from=12, start=0, final_start=10) == 62
 
 def test_handle_card_exchange_after_round_zero():
     # Testet den Fall, wenn cnt_round=0 und bereits bool_card_exchanged=True ist.
@@ -1291,3 +1299,860 @@ def test_invalid_final_area_move():
     assert game.state.idx_player_active != 0, "Zug sollte trotzdem weitergehen, obwohl Aktion ungültig war."
 
 
+# =======================================================
+# Tests für den Positionsindex (Feld -> Spieler, Murmel)
+# =======================================================
+def test_board_index_after_set_state(game):
+    state = game.get_state()
+    state.list_player[1].list_marble[2].pos = 20
+    game.set_state(state)
+    m, idx = game._find_marble_by_pos(20)
+    assert m is state.list_player[1].list_marble[2]
+    assert idx == 1
+    assert game._find_marble_by_pos(74) == (None, None)
+
+def test_board_index_follows_moves(game):
+    state = game.get_state()
+    state.idx_player_active = 0
+    p0 = state.list_player[0]
+    p0.list_card = [Card(suit='♥', rank='5')]
+    p0.list_marble[0].pos = 3
+    state.list_player[1].list_marble[0].pos = 8
+    game.set_state(state)
+    game.apply_action(Action(card=Card(suit='♥', rank='5'), pos_from=3, pos_to=8))
+    board = [list(slot) for slot in game._board]
+    game._rebuild_board()
+    assert board == game._board
+    assert game._find_marble_by_pos(8)[1] == 0
+    assert game._find_marble_by_pos(72)[1] == 1
+
+def test_board_index_detects_direct_changes(game):
+    game.state.list_player[2].list_marble[0].pos = 40
+    game.state.list_player[2].list_marble[0].is_save = True
+    game.get_list_action()
+    assert game._blocked_on_main_path(40)
+    assert game._find_marble_by_pos(80) == (None, None)
+
+def test_board_masks_follow_moves():
+    random.seed(5)
+    game = Dog()
+    for _ in _play_random_plies(game, 5, 150, push=True):
+        masks = (game._save_mask, game._occupied_mask)
+        game._rebuild_board()
+        assert masks == (game._save_mask, game._occupied_mask)
+    while game._action_stack:
+        game.pop_action()
+    masks = (game._save_mask, game._occupied_mask)
+    game._rebuild_board()
+    assert masks == (game._save_mask, game._occupied_mask)
+
+def test_progress_counters_follow_moves():
+    random.seed(6)
+    game = Dog()
+    assert game._cnt_area == [[4, 0, 0]] * 4
+    for _ in _play_random_plies(game, 6, 200, push=True):
+        counters = [list(c) for c in game._cnt_area]
+        game._rebuild_board()
+        assert counters == game._cnt_area
+
+def test_check_game_status_after_direct_changes(game):
+    fs = Dog.PLAYER_BOARD_SEGMENTS[2]['final_start']
+    for i, marble in enumerate(game.state.list_player[2].list_marble[:3]):
+        marble.pos = fs + i
+    game.check_game_status()
+    assert game.state.phase == GamePhase.RUNNING
+    assert game._cnt_area[2] == [1, 0, 3]
+    game.state.list_player[2].list_marble[3].pos = fs + 3
+    game.check_game_status()
+    assert game._player_finished(2)
+    assert game.state.phase == GamePhase.FINISHED
+
+def test_path_clear_uses_masks(game):
+    state = game.get_state()
+    state.idx_player_active = 0
+    state.list_player[1].list_marble[0].pos = 16
+    state.list_player[1].list_marble[0].is_save = True
+    state.list_player[0].list_marble[0].pos = 69
+    game.set_state(state)
+    assert game._save_mask == 1 << 16
+    assert not game._path_clear(10, 20, 0)
+    assert not game._path_clear(10, 16, 0)
+    assert game._path_clear(20, 30, 0)
+    # Spieler 0 von Feld 62 in die Zielzone: Feld 69 ist besetzt
+    assert game._path_clear(62, 68, 0)
+    assert not game._path_clear(62, 70, 0)
+    game._set_marble_save(1, 0, False)
+    assert game._path_clear(10, 20, 0)
+
+
+# =======================================================
+# Tests für die vorberechneten Zugtabellen (MoveTables)
+# =======================================================
+def test_move_tables_match_arithmetic():
+    tables = Dog.MOVE_TABLES
+    for player in range(4):
+        for pos_from in range(0, 96, 5):
+            for dist in range(-4, 14):
+                assert (tables.pos_to_of(player, pos_from, dist, dist < 0) ==
+                        tables.calc_pos_to(player, pos_from, dist, dist < 0))
+            for pos_to in range(0, 96, 3):
+                for four in (False, True):
+                    assert (tables.path_of(player, pos_from, pos_to, four) ==
+                            tables.calc_path(player, pos_from, pos_to, four))
+                    assert (tables.steps_of(player, pos_from, pos_to, four) ==
+                            tables.calc_steps(player, pos_from, pos_to, four))
+                    assert (tables.path_mask_of(player, pos_from, pos_to, four) ==
+                            tables.calc_path_mask(tables.calc_path(player, pos_from, pos_to, four)))
+
+def test_move_tables_paths():
+    tables = Dog.MOVE_TABLES
+    # Spieler 0 von Feld 60 mit 2 Schritten
+    assert tables.path_of(0, 60, 62, False) == ((61, 62), ())
+    # Rückwärts mit der 4
+    assert tables.path_of(0, 2, 62, True) == ((1, 0, 63, 62), ())
+    # Aus dem Zwinger zurück auf das Spielfeld geht nie
+    assert tables.path_of(0, 70, 10, False) is None
+
+def test_move_tables_outside_board():
+    tables = MoveTables(Dog.PLAYER_BOARD_SEGMENTS, Dog.MAIN_PATH_LENGTH, Dog.BOARD_SIZE)
+    assert tables.pos_to_of(0, 10, 20, False) == tables.calc_pos_to(0, 10, 20, False)
+    assert tables.steps_of(0, 10, -1, False) == tables.calc_steps(0, 10, -1, False)
+    assert tables.path_of(0, 10, 200, False) == tables.calc_path(0, 10, 200, False)
+
+def test_move_tables_fill_lazily():
+    tables = MoveTables(Dog.PLAYER_BOARD_SEGMENTS, Dog.MAIN_PATH_LENGTH, Dog.BOARD_SIZE)
+    assert not tables._steps and not tables._path and not tables._path_mask
+    assert tables.path_mask_of(0, 10, 15, False) == tables.path_mask_of(0, 10, 15, False)
+    assert tables.steps_of(0, 10, 15, False) == 5
+    tables.steps_of(0, 10, 200, False)
+    assert len(tables._steps) == 1 and len(tables._path) == 1 and len(tables._path_mask) == 1
+
+
+# =======================================================
+# Tests für RulesOverride (Szenario-Hooks)
+# =======================================================
+class FixedStepsOverride(RulesOverride):
+    def calc_steps(self, game, pos_from, pos_to):
+        return 3 if (pos_from, pos_to) == (10, 50) else None
+
+class SkipActionOverride(RulesOverride):
+    def __init__(self):
+        self.cnt_called = 0
+
+    def apply_action(self, game, action):
+        self.cnt_called += 1
+        return True
+
+def test_rules_override_default_hooks():
+    override = RulesOverride()
+    game = Dog(rules_override=override)
+    assert override.calc_steps(game, 0, 1) is None
+    assert override.apply_action(game, None) is False
+    assert game._calc_steps(64, 0, 0) == 1
+
+def test_rules_override_calc_steps():
+    game = Dog(rules_override=FixedStepsOverride())
+    assert game._calc_steps(10, 50, 0) == 3
+    assert game._calc_steps(10, 20, 0) == 10
+
+def test_rules_override_apply_action():
+    override = SkipActionOverride()
+    game = Dog(rules_override=override)
+    idx_player_active = game.state.idx_player_active
+    game.apply_action(None)
+    assert override.cnt_called == 1
+    assert game.state.idx_player_active == idx_player_active
+
+
+# =======================================================
+# Tests für Action-Keys und _unique_sorted_actions
+# =======================================================
+def test_action_key():
+    a1 = Action(card=Card(suit='♥', rank='K'), pos_from=10, pos_to=20)
+    a2 = Action(card=Card(suit='♥', rank='K'), pos_from=10, pos_to=20)
+    a3 = Action(card=Card(suit='', rank='JKR'), card_swap=Card(suit='♥', rank='K'))
+    assert a1.key() == a2.key()
+    assert hash(a1.key()) == hash(a2.key())
+    assert a1.key() != a3.key()
+    assert Action(card=Card(suit='♥', rank='1')).key() == (('♥', '1'), None, None, None)
+
+def test_unique_sorted_actions_matches_string_order(game):
+    cards = [Card(suit=s, rank=r) for s in GameState.LIST_SUIT for r in GameState.LIST_RANK[:-1]]
+    cards.append(Card(suit='', rank='JKR'))
+    rng = random.Random(4)
+    actions = []
+    for _ in range(300):
+        swap = rng.choice(cards + [None])
+        actions.append(Action(card=rng.choice(cards + [None]), pos_from=rng.choice([None, 3, 64, 70]),
+                              pos_to=rng.choice([None, 0, 16, 90]), card_swap=swap))
+    expected = []
+    for a in actions:
+        if a not in expected:
+            expected.append(a)
+    expected.sort(key=lambda x: (str(x.card),
+                                 x.pos_from if x.pos_from is not None else -999,
+                                 x.pos_to if x.pos_to is not None else -999,
+                                 str(x.card_swap) if x.card_swap else ''))
+    assert [repr(a) for a in game._unique_sorted_actions(actions)] == [repr(a) for a in expected]
+
+def test_unique_sorted_actions_with_unknown_card(game):
+    a1 = Action(card=Card(suit='♥', rank='1'), pos_from=1, pos_to=2)
+    a2 = Action(card=Card(suit='♠', rank='2'), pos_from=1, pos_to=2)
+    assert game._unique_sorted_actions([a1, a2, a1]) == [a2, a1]
+
+
+# =======================================================
+# Tests für die kanonischen Karten (LIST_CARD_DISTINCT)
+# =======================================================
+def test_card_distinct_table():
+    assert len(LIST_CARD_DISTINCT) == 53
+    assert len({(c.suit, c.rank) for c in LIST_CARD_DISTINCT}) == 53
+    assert all(any(c is d for d in LIST_CARD_DISTINCT) for c in GameState.LIST_CARD)
+    assert get_card('♥', 'A') is get_card('♥', 'A')
+    assert get_card('♥', 'A') == Card(suit='♥', rank='A')
+    assert get_card('♥', '1') == Card(suit='♥', rank='1')
+
+def test_card_ordinal_and_hash():
+    cards = [Card(suit=s, rank=r) for s in ['♣', '♥', '♠', '♦'] for r in ['A', '10', '2', 'Q']]
+    cards.append(Card(suit='', rank='JKR'))
+    suit_order = ['♠', '♥', '♦', '♣', '']
+    rank_order = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A', 'JKR']
+    expected = sorted(cards, key=lambda c: (suit_order.index(c.suit), rank_order.index(c.rank)))
+    assert sorted(cards) == expected
+    assert hash(Card(suit='♥', rank='A')) == hash(get_card('♥', 'A'))
+    assert len({Card(suit='♥', rank='A'), get_card('♥', 'A')}) == 1
+    assert Card(suit='♥', rank='1').ordinal is None
+    with pytest.raises(ValueError):
+        _ = Card(suit='♥', rank='1') < Card(suit='♥', rank='2')
+
+def test_card_is_immutable_and_shared_by_copies(game):
+    card = get_card('♠', '7')
+    with pytest.raises(Exception):
+        card.rank = '8'
+    assert copy.deepcopy(card) is card
+    state = copy.deepcopy(game.get_state())
+    assert state.list_card_draw[0] is game.get_state().list_card_draw[0]
+
+
+# =======================================================
+# Tests für das Änderungsprotokoll der Sieben (MarbleJournal)
+# =======================================================
+def _seven_scenario(game):
+    state = game.get_state()
+    state.idx_player_active = 0
+    state.card_active = None
+    p0, p1 = state.list_player[0], state.list_player[1]
+    p0.list_card = [get_card('♠', '7')]
+    p0.list_marble[0].pos, p0.list_marble[0].is_save = 0, True
+    p1.list_marble[0].pos, p1.list_marble[0].is_save = 2, False
+    game.set_state(state)
+    return p0, p1
+
+def test_seven_journal_records_only_changes(game):
+    p0, p1 = _seven_scenario(game)
+    game.apply_action(Action(card=get_card('♠', '7'), pos_from=0, pos_to=3))
+    journal = game.temp_seven_journal
+    assert isinstance(journal, MarbleJournal)
+    assert game.state.card_active == get_card('♠', '7')
+    assert p1.list_marble[0].pos == 72
+    assert set(journal.origin) == {(0, 0), (1, 0)}
+    assert sorted(game._seven_moved_marbles()) == [(0, 0), (1, 0)]
+    assert all(a.pos_from is not None and a.card.rank == '7' for a in game.get_list_action())
+
+def test_seven_journal_rollback(game):
+    p0, p1 = _seven_scenario(game)
+    discard = list(game.state.list_card_discard)
+    game.apply_action(Action(card=get_card('♠', '7'), pos_from=0, pos_to=3))
+    game._rollback_seven()
+    assert (p0.list_marble[0].pos, p0.list_marble[0].is_save) == (0, True)
+    assert (p1.list_marble[0].pos, p1.list_marble[0].is_save) == (2, False)
+    assert game.temp_seven_journal is None
+    assert game.state.idx_player_active == 0
+    assert game.state.list_card_discard == discard
+    assert game._locate_marble(2) == (1, 0)
+    assert game._locate_marble(72) is None
+
+def test_seven_journal_restores_cards_of_new_round(game):
+    _seven_scenario(game)
+    game.apply_action(Action(card=get_card('♠', '7'), pos_from=0, pos_to=3))
+    hands = [list(p.list_card) for p in game.state.list_player]
+    cnt_round = game.state.cnt_round
+    game.turns_in_current_round = game.state.cnt_player - 1
+    game.next_turn()
+    assert game.state.cnt_round == cnt_round + 1
+    game._rollback_seven()
+    assert game.state.cnt_round == cnt_round
+    assert [p.list_card for p in game.state.list_player] == hands
+
+
+# =======================================================
+# Tests für push_action / pop_action
+# =======================================================
+def _dump(game):
+    return (game.get_state().model_dump(), game.turns_in_current_round, game.temp_seven_moves,
+            game.temp_seven_card, game.temp_joker_card)
+
+def test_push_pop_restores_random_game(game):
+    for _ in _play_random_plies(game, 3, 150):
+        before = _dump(game)
+        for action in game.get_list_action()[:5] + [None]:
+            game.push_action(action)
+            game.pop_action()
+            assert _dump(game) == before
+
+def test_push_pop_nested_seven(game):
+    _seven_scenario(game)
+    before = _dump(game)
+    game.push_action(Action(card=get_card('♠', '7'), pos_from=0, pos_to=3))
+    middle = _dump(game)
+    game.push_action(Action(card=get_card('♠', '7'), pos_from=3, pos_to=7))
+    assert game.temp_seven_moves is None
+    game.pop_action()
+    assert _dump(game) == middle
+    assert game.temp_seven_journal is not None and len(game.temp_seven_journal.origin) == 2
+    game.pop_action()
+    assert _dump(game) == before
+    assert game._locate_marble(2) == (1, 0)
+
+def test_push_pop_restores_round_transition(game):
+    state = game.get_state()
+    game.turns_in_current_round = state.cnt_player - 1
+    state.list_player[state.idx_player_active].list_card = []
+    game.set_state(state)
+    draw = list(state.list_card_draw)
+    before = _dump(game)
+    game.push_action(None)
+    assert game.get_state().cnt_round == before[0]['cnt_round'] + 1
+    game.pop_action()
+    assert _dump(game) == before
+    assert game.get_state().list_card_draw == draw
+
+def test_pop_action_without_push(game):
+    with pytest.raises(ValueError):
+        game.pop_action()
+
+
+# =======================================================
+# Tests für den Cache von get_list_action
+# =======================================================
+def test_list_action_cache_hit_and_miss(game):
+    actions = game.get_list_action()
+    misses = game.action_cache_misses
+    assert game.get_list_action() == actions
+    assert game.action_cache_hits == 1
+    assert game.action_cache_misses == misses
+    game.set_state(game.get_state())
+    game.get_list_action()
+    assert game.action_cache_misses == misses + 1
+
+def test_list_action_cache_detects_in_place_edits(game):
+    state = game.get_state()
+    state.list_player[state.idx_player_active].list_card = [get_card('♠', 'A')]
+    assert game.get_list_action()
+    state.list_player[state.idx_player_active].list_card = [get_card('♠', '2')]
+    assert game.get_list_action() == []
+    assert game.action_cache_hits == 0
+
+def test_no_action_reuses_cached_list(game):
+    state = game.get_state()
+    state.list_player[state.idx_player_active].list_card = [get_card('♠', '2')]
+    assert game.get_list_action() == []
+    game.apply_action(None)
+    assert game.action_cache_hits == 1
+
+def test_list_action_cache_misses_after_action(game):
+    actions = game.get_list_action()
+    game.apply_action(actions[0])
+    misses = game.action_cache_misses
+    game.get_list_action()
+    assert game.action_cache_misses == misses + 1
+
+
+# =======================================================
+# Tests für die inkrementelle Zugberechnung
+# =======================================================
+def _place_marbles(game, positions):
+    state = game.get_state()
+    state.idx_player_active = 0
+    state.card_active = None
+    for p_idx, player in enumerate(state.list_player):
+        for m_idx, marble in enumerate(player.list_marble):
+            queue_start = game.PLAYER_BOARD_SEGMENTS[p_idx]['queue_start']
+            marble.pos, marble.is_save = positions.get((p_idx, m_idx), (queue_start + m_idx, False))
+    game.set_state(state)
+
+def test_moves_reused_while_squares_unchanged(game):
+    _place_marbles(game, {(0, 0): (10, False), (0, 1): (40, False), (1, 0): (50, False)})
+    card = get_card('♠', '5')
+    first = game._get_standard_actions(card, 5)
+    key = (card, (5,), 0, False)
+    entry_10 = game._move_cache[key + (10,)]
+    entry_40 = game._move_cache[key + (40,)]
+    game._set_marble_pos(1, 0, 43)
+    second = game._get_standard_actions(card, 5)
+    assert game._move_cache[key + (10,)] is entry_10
+    assert game._move_cache[key + (40,)] is not entry_40
+    assert [repr(a) for a in first] == [repr(a) for a in second]
+
+def test_moves_recomputed_when_path_blocked(game):
+    _place_marbles(game, {(0, 0): (10, False)})
+    card = get_card('♠', '5')
+    assert [a.pos_to for a in game._get_standard_actions(card, 5)] == [15]
+    game._set_marble_pos(1, 0, 12)
+    game._set_marble_save(1, 0, True)
+    assert game._get_standard_actions(card, 5) == []
+
+def test_moves_cache_sees_in_place_edits(game):
+    _place_marbles(game, {(0, 0): (10, False), (1, 0): (12, False)})
+    card = get_card('♠', '5')
+    game.get_state().list_player[0].list_card = [card]
+    assert [a.pos_to for a in game.get_list_action() if a.pos_from == 10] == [15]
+    game.get_state().list_player[1].list_marble[0].is_save = True
+    assert not [a for a in game.get_list_action() if a.card == card and a.pos_from == 10]
+
+
+# =======================================================
+# Tests für Zobrist-Hash und Transpositionstabelle
+# =======================================================
+def test_zobrist_hash_incremental_matches_rebuild(game):
+    for _ in _play_random_plies(game, 5, 120):
+        key = game.zobrist_hash()
+        game._rebuild_board()
+        assert game.zobrist_hash() == key
+
+def test_zobrist_hash_push_pop(game):
+    key = game.zobrist_hash()
+    action = game.get_list_action()[0]
+    game.push_action(action)
+    assert game.zobrist_hash() != key
+    game.pop_action()
+    assert game.zobrist_hash() == key
+
+def test_zobrist_hash_hand_is_multiset(game):
+    state = game.get_state()
+    key = game.zobrist_hash()
+    hand = state.list_player[0].list_card
+    state.list_player[0].list_card = list(reversed(hand))
+    assert game.zobrist_hash() == key
+    state.list_player[0].list_card = hand[1:]
+    assert game.zobrist_hash() != key
+    assert Dog().zobrist_hash() != key
+
+def test_zobrist_hash_hand_swapped_in_place(game):
+    hand = game.get_state().list_player[0].list_card
+    key = game.zobrist_hash()
+    hand[0] = next(card for card in LIST_CARD_DISTINCT if card not in hand)
+    assert game.zobrist_hash() != key
+    swapped = game.zobrist_hash()
+    game._rebuild_hand_hash()
+    assert game.zobrist_hash() == swapped
+
+def test_transposition_table_replacement():
+    table = TranspositionTable(size_bits=2)
+    assert table.lookup(5) is None
+    assert table.store(5, 'deep', depth=3)
+    assert not table.store(9, 'shallow', depth=1)
+    assert not table.store(5, 'same key, shallow', depth=2)
+    assert table.store(5, 'deep', depth=3)
+    assert len(table) == 1
+    assert table.lookup(5, depth=2) == 'deep'
+    assert table.lookup(5, depth=4) is None
+    table.new_generation()
+    assert table.store(9, 'shallow', depth=1)
+    assert table.lookup(5) is None
+    assert table.lookup(9) == 'shallow'
+    assert len(table) == 1
+    assert (table.hits, table.misses) == (2, 3)
+    table.clear()
+    assert len(table) == 0
+
+
+# =======================================================
+# Tests für iter_actions
+# =======================================================
+def test_iter_actions_matches_list_action(game):
+    for _ in _play_random_plies(game, 11, 120):
+        lazy = list(game.iter_actions())
+        assert len(lazy) == len({a.key() for a in lazy})
+        assert sorted(lazy, key=lambda a: a.sort_key()) == game.get_list_action()
+
+def test_iter_actions_follows_hand_order(game):
+    _place_marbles(game, {(0, 0): (10, False)})
+    five, two = get_card('♠', '5'), get_card('♥', '2')
+    game.get_state().list_player[0].list_card = [five, two]
+    assert [a.card for a in game.iter_actions()] == [five, two]
+    first = next(game.iter_actions())
+    assert (first.card, first.pos_from, first.pos_to) == (five, 10, 15)
+
+
+# =======================================================
+# Tests für sample_action
+# =======================================================
+def test_sample_action_is_uniform(game):
+    _place_marbles(game, {(0, 0): (10, False), (0, 1): (30, False), (1, 0): (14, False)})
+    hand = [get_card('♠', 'A'), get_card('♥', '4'), get_card('♦', 'J'), get_card('', 'JKR'), get_card('♠', 'A')]
+    game.get_state().list_player[0].list_card = hand
+    expected = {a.key() for a in game.get_list_action()}
+    game._action_cache = None
+    rng = random.Random(3)
+    counts = {}
+    for _ in range(40 * len(expected)):
+        key = game.sample_action(rng).key()
+        counts[key] = counts.get(key, 0) + 1
+    assert set(counts) == expected
+    assert min(counts.values()) > 15 and max(counts.values()) < 70
+
+def test_sample_action_matches_list_action(game):
+    rng = random.Random(4)
+    for _ in _play_random_plies(game, 4, 200):
+        action = game.sample_action(rng)
+        actions = game.get_list_action()
+        assert (action is None) == (not actions)
+        assert action is None or action in actions
+
+def test_sample_action_without_actions(game):
+    _place_marbles(game, {})
+    game.get_state().list_player[0].list_card = [get_card('♠', '5'), get_card('♥', '7')]
+    assert game.sample_action(random.Random(1)) is None
+
+def test_random_player_samples_from_game(game):
+    player = RandomPlayer(game, random.Random(2))
+    action = player.select_action(game.get_state(), [])
+    assert action in game.get_list_action()
+    assert RandomPlayer().select_action(game.get_state(), []) is None
+
+def test_random_player_prefers_given_actions(game):
+    actions = game.get_list_action()[:1]
+    player = RandomPlayer(game, random.Random(3))
+    assert player.select_action(game.get_state(), actions) == actions[0]
+
+
+# =======================================================
+# Tests für has_any_action
+# =======================================================
+def test_has_any_action_matches_list_action(game):
+    for _ in _play_random_plies(game, 6, 200):
+        has_action = game.has_any_action()
+        assert has_action == bool(game.get_list_action())
+
+def test_has_any_action_short_circuits(game):
+    _place_marbles(game, {})
+    state = game.get_state()
+    state.list_player[0].list_card = [get_card('♠', '5'), get_card('♥', '7')]
+    assert not game.has_any_action()
+    state.list_player[0].list_card.append(get_card('', 'JKR'))
+    misses = game.action_cache_misses
+    assert game.has_any_action()
+    assert game.action_cache_misses == misses
+    assert game._move_cache == {}
+
+
+# =======================================================
+# Tests für den faktorisierten Aktionsraum
+# =======================================================
+def test_choices_cover_list_action(game):
+    for _ in _play_random_plies(game, 7, 200):
+        choices = game.get_list_choice()
+        factorized = [a for choice in choices for a in game.get_list_action_for_choice(choice)]
+        assert all(game.get_list_action_for_choice(choice) for choice in choices)
+        assert {a.key() for a in factorized} == {a.key() for a in game.get_list_action()}
+
+def test_choices_for_joker(game):
+    _place_marbles(game, {(0, 0): (10, False), (0, 1): (30, False)})
+    joker = get_card('', 'JKR')
+    game.get_state().list_player[0].list_card = [joker]
+    choices = game.get_list_choice()
+    assert len([c for c in choices if c.card_swap is not None]) == 13
+    assert [c.distance for c in choices if c.distance is not None] == list(range(1, 14))
+    assert len(choices) == 27 and len(game.get_list_action()) == 40
+    swap = ActionChoice(card=joker, card_swap=get_card('♥', 'Q'))
+    assert game.get_list_action_for_choice(swap) == [
+        Action(card=joker, pos_from=None, pos_to=None, card_swap=get_card('♥', 'Q'))]
+    moves = game.get_list_action_for_choice(ActionChoice(card=joker, distance=5))
+    assert [(a.pos_from, a.pos_to) for a in moves] == [(10, 15), (30, 35)]
+
+def test_choices_for_joker_in_round_zero(game):
+    _place_marbles(game, {})
+    state = game.get_state()
+    state.cnt_round = 0
+    state.bool_card_exchanged = True
+    state.list_player[0].list_card = [get_card('', 'JKR')]
+    choices = game.get_list_choice()
+    assert [c.card_swap.rank for c in choices if c.card_swap is not None] == ['A', 'K'] * 4
+    assert [c for c in choices if c.card_swap is None] == [ActionChoice(card=get_card('', 'JKR'))]
+
+def test_illegal_choice_has_no_actions(game):
+    _place_marbles(game, {(0, 0): (10, False)})
+    game.get_state().list_player[0].list_card = [get_card('♠', '5')]
+    assert game.get_list_action_for_choice(ActionChoice(card=get_card('♠', '6'), distance=6)) == []
+    assert game.get_list_action_for_choice(ActionChoice(card=get_card('♠', '5'), distance=6)) == []
+    assert len(game.get_list_action_for_choice(ActionChoice(card=get_card('♠', '5'), distance=5))) == 1
+
+
+# =======================================================
+# Tests für die Instrumentierung
+# =======================================================
+def test_stats_count_hot_paths(game):
+    assert game.stats is None
+    stats = game.enable_stats()
+    for _ in _play_random_plies(game, 9, 60):
+        pass
+    result = stats.as_dict()
+    assert result['calls']['get_list_action'] >= 60
+    assert result['calls']['apply_action'] == 60
+    assert result['calls']['is_valid_move'] > 0
+    assert sum(result['action_list_sizes'].values()) == result['calls']['get_list_action']
+    assert result['round_transitions'] == game.get_state().cnt_round - 1
+    assert set(result['seconds']) == set(result['calls'])
+
+def test_stats_reset_and_disable(game):
+    stats = game.enable_stats()
+    game.get_list_action()
+    clone = copy.deepcopy(game)
+    clone.get_list_action()
+    assert stats.calls['get_list_action'] == 1
+    assert clone.stats.calls['get_list_action'] == 2
+    game.reset()
+    assert stats.as_dict() == {'calls': {}, 'seconds': {}, 'round_transitions': 0, 'action_list_sizes': {}}
+    game.disable_stats()
+    assert 'get_list_action' not in vars(game)
+    game.get_list_action()
+    assert game.stats is None and stats.calls == {}
+
+
+# =======================================================
+# Tests für das Binärformat von GameState
+# =======================================================
+def test_state_bytes_round_trip(game):
+    for _ in _play_random_plies(game, 12, 150):
+        state = game.get_state()
+        data = state.to_bytes()
+        assert len(data) < 200
+        assert GameState.from_bytes(data) == state
+
+def test_state_bytes_custom_values(game):
+    state = game.get_state()
+    state.list_player[2].name = 'Zoë'
+    state.list_player[1].list_marble[3].is_save = True
+    state.card_active = get_card('♦', '7')
+    state.phase = GamePhase.FINISHED
+    decoded = GameState.from_bytes(state.to_bytes())
+    assert decoded == state
+    assert decoded.model_dump_json() == state.model_dump_json()
+    assert decoded.list_player[2].name == 'Zoë'
+    assert all(c is get_card(c.suit, c.rank) for c in decoded.list_card_draw)
+
+def test_state_bytes_invalid(game):
+    state = game.get_state()
+    data = state.to_bytes()
+    with pytest.raises(ValueError):
+        GameState.from_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        GameState.from_bytes(b'\x02' + data[1:])
+    state.list_player[0].list_card.append(Card(suit='X', rank='1'))
+    with pytest.raises(ValueError):
+        state.to_bytes()
+
+
+# =======================================================
+# Tests für GameRecord
+# =======================================================
+def _record_game(record, cnt_moves):
+    game = record.new_game()
+    rng = random.Random(record.seed)
+    states = [game.get_state().model_copy(deep=True)]
+    for _ in range(cnt_moves):
+        if game.get_state().phase == GamePhase.FINISHED:
+            break
+        action = game.sample_action(rng)
+        record.append(game, action)
+        game.apply_action(action)
+        states.append(game.get_state().model_copy(deep=True))
+    return states
+
+def test_game_record_replay():
+    record = GameRecord(seed=21)
+    states = _record_game(record, 400)
+    decoded = GameRecord.from_bytes(record.to_bytes())
+    assert len(record.to_bytes()) < 2 * len(record) + 10
+    assert decoded.list_code == record.list_code
+    assert decoded.replay().get_state() == states[-1]
+    assert decoded.replay(137).get_state() == states[137]
+    assert decoded.replay(0).get_state() == states[0]
+
+def test_game_record_from_state(game):
+    state = game.get_state()
+    state.cnt_round = 3
+    record = GameRecord(seed=5, state=state)
+    states = _record_game(record, 50)
+    decoded = GameRecord.from_bytes(record.to_bytes())
+    assert decoded.state == state
+    assert decoded.replay().get_state() == states[-1]
+
+def test_game_record_invalid():
+    record = GameRecord(seed=1)
+    game = record.new_game()
+    with pytest.raises(ValueError):
+        record.append(game, Action(card=get_card('♠', '5'), pos_from=3, pos_to=90))
+    record.list_code = [200]
+    with pytest.raises(ValueError):
+        record.replay()
+    with pytest.raises(ValueError):
+        GameRecord.from_bytes(b'\x01\x04\x80')
+
+def test_game_replay_seek():
+    record = GameRecord(seed=8)
+    states = _record_game(record, 600)
+    replay = GameReplay(record)
+    order = list(range(len(record) + 1))
+    random.Random(2).shuffle(order)
+    for idx_move in order[:80] + [len(record), 0, len(record) - 1]:
+        assert replay.seek(idx_move).get_state() == states[idx_move]
+    assert len(replay.checkpoints) == states[-1].cnt_round - states[0].cnt_round
+    with pytest.raises(ValueError):
+        replay.seek(len(record) + 1)
+
+
+# =======================================================
+# Tests für Zustandskopien
+# =======================================================
+def test_player_copy_with_cards(game):
+    player = game.get_state().list_player[0]
+    copy_player = player.copy_with_cards([])
+    assert copy_player.name == player.name and copy_player.list_card == []
+    assert copy_player.list_marble == player.list_marble
+    copy_player.list_marble[0].pos = 5
+    assert player.list_marble[0].pos != 5
+
+def test_state_snapshot(game):
+    state = game.get_state()
+    copy_state = state.snapshot()
+    assert copy_state == state
+    assert copy_state.model_dump() == state.model_copy(deep=True).model_dump()
+    copy_state.list_player[0].list_marble[0].pos = 5
+    copy_state.list_player[0].list_card.pop()
+    copy_state.list_card_draw.pop()
+    assert copy_state != state
+    assert state.list_player[0].list_marble[0].pos != 5
+    assert len(state.list_player[0].list_card) == 6 and len(state.list_card_draw) == 86
+
+
+# =======================================================
+# Tests für die maskierte Sicht (get_player_view)
+# =======================================================
+def test_player_view_masks_hidden_cards(game):
+    state = game.get_state()
+    view = game.get_player_view(1)
+    assert isinstance(view, MaskedGameState)
+    assert view.list_player[1].list_card == state.list_player[1].list_card
+    for idx in (0, 2, 3):
+        assert view.list_player[idx].list_card == [GameState.CARD_BACK] * len(state.list_player[idx].list_card)
+        assert view.list_player[idx].list_marble == state.list_player[idx].list_marble
+    assert view.list_card_draw == [] and view.cnt_card_draw == len(state.list_card_draw)
+    assert view.idx_player_active == state.idx_player_active
+    with pytest.raises(ValueError):
+        game.get_player_view(4)
+
+def test_player_view_cached_per_version(game):
+    view = game.get_player_view(0)
+    assert game.get_player_view(0) is view
+    assert game.get_player_view(2) is not view
+    game.apply_action(None)
+    view_next = game.get_player_view(0)
+    assert view_next is not view
+    assert view_next == game.state.get_masked_state(0)
+    game.state.list_player[1].list_marble[0].pos = 20
+    assert game.get_player_view(0).list_player[1].list_marble[0].pos == 20
+    game.state.list_player[0].list_card.pop()
+    assert game.get_player_view(0).list_player[0].list_card == game.state.list_player[0].list_card
+
+def test_player_view_is_a_copy(game):
+    view = game.get_player_view(0)
+    pos = view.list_player[0].list_marble[0].pos
+    game.state.list_player[0].list_marble[0].pos = 0
+    assert view.list_player[0].list_marble[0].pos == pos
+    assert 'cnt_card_draw' in view.model_dump() and 'cnt_card_draw' not in game.state.model_dump()
+
+
+# =======================================================
+# Tests für successors
+# =======================================================
+def _board_after(game, action):
+    before = [[(m.pos, m.is_save) for m in p.list_marble] for p in game.state.list_player]
+    game.push_action(action)
+    after = [[(m.pos, m.is_save) for m in p.list_marble] for p in game.state.list_player]
+    game.pop_action()
+    return tuple((p_idx, m_idx, pos, is_save)
+                 for p_idx, (old, new) in enumerate(zip(before, after))
+                 for m_idx, (o, (pos, is_save)) in enumerate(zip(old, new)) if o != (pos, is_save))
+
+def test_successors_match_applied_actions():
+    random.seed(9)
+    game = Dog(rng=random.Random(9))
+    for _ in _play_random_plies(game, 9, 120):
+        rng_state = game.rng.getstate()
+        state = game.get_state().model_dump()
+        successors = game.successors()
+        assert game.rng.getstate() == rng_state and game.get_state().model_dump() == state
+        assert [a for a, _ in successors] == (game.get_list_action() or [None])
+        for action, changes in successors:
+            assert changes == _board_after(game, action)
+        game.rng.setstate(rng_state)
+
+def test_successors_knock_out_with_seven(game):
+    state = game.get_state()
+    state.idx_player_active = 0
+    state.list_player[0].list_card = [Card(suit='♠', rank='7')]
+    state.list_player[0].list_marble[0].pos = 10
+    state.list_player[1].list_marble[0].pos = 12
+    state.list_player[2].list_marble[0].pos = 14
+    game.set_state(state)
+    successors = dict((a.pos_to, changes) for a, changes in game.successors() if a.pos_from == 10)
+    # Zwei Schritte schlagen die Murmel auf 12, fünf Schritte zusätzlich die auf 14
+    assert successors[12] == ((0, 0, 12, False), (1, 0, 72, False))
+    assert successors[15] == ((0, 0, 15, False), (1, 0, 72, False), (2, 0, 80, False))
+
+
+# =======================================================
+# Tests für die Rangtabelle (RankMoves)
+# =======================================================
+def test_rank_moves_table():
+    table = Dog.RANK_MOVES
+    assert set(table) == set(GameState.LIST_RANK)
+    assert table['A'].distances == (1, 11) and table['A'].can_start
+    assert table['4'].distances == (-4,) and table['4'].backward
+    assert table['7'].distances == tuple(range(1, 8)) and not table['7'].can_start
+    assert table['J'].distances == () and table['J'].generator == '_generate_jack'
+    assert table['JKR'].handler == '_handle_card_joker' and table['Q'].handler == '_handle_card_other'
+    for rank, rules in table.items():
+        assert isinstance(rules, RankMoves)
+        assert Dog().get_move_distance(get_card('♠', rank)) == rules.move_distance
+
+def test_rank_moves_flags():
+    table = Dog.RANK_MOVES
+    assert [rank for rank, rules in table.items() if rules.swaps] == ['J']
+    assert [rank for rank, rules in table.items() if rules.wildcard] == ['JKR']
+    assert [rank for rank, rules in table.items() if rules.splits] == ['7']
+    assert [rank for rank, rules in table.items() if rules.backward] == ['4']
+    assert sorted(rank for rank, rules in table.items() if rules.can_start) == ['A', 'JKR', 'K']
+    no_rules = Dog()._rules_of(None)
+    assert no_rules is Dog()._rules_of(Card(suit='', rank='BCK'))
+    assert not (no_rules.distances or no_rules.can_start or no_rules.swaps or no_rules.wildcard or no_rules.splits)
+
+def test_rank_moves_dispatch_on_game():
+    calls = []
+
+    class CountingDog(Dog):
+        def _handle_card_other(self, player, found_card, action):
+            calls.append(found_card.rank)
+            super()._handle_card_other(player, found_card, action)
+
+    dog = CountingDog()
+    state = dog.get_state()
+    state.idx_player_active = 0
+    state.list_player[0].list_card = [Card(suit='♥', rank='5')]
+    state.list_player[0].list_marble[0].pos = 3
+    dog.set_state(state)
+    dog.apply_action(Action(card=Card(suit='♥', rank='5'), pos_from=3, pos_to=8))
+    assert calls == ['5']
+    assert dog.state.list_player[0].list_marble[0].pos == 8